@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Batch analysis of all puzzles in the database over a process pool. Run e.g.
+
+    python -m bce.batch puzzles/database.csv results.csv
+
+Results stream into a CSV table as puzzles finish. Puzzles whose shape is
+unchanged since they were last analysed by the same VERSION are skipped.
+"""
+
+import argparse
+import csv
+import multiprocessing as mp
+import os
+import numpy as np
+from . import core
+from .graph import bfs, degrees, explore_csr
+from .metrics import extremes
+
+
+# bump whenever the computed statistics change
+VERSION = 1
+FIELDS = ["Name", "Shape", "Version", "States", "Edges", "Diameter", "Radius",
+          "SolvedEccentricity", "DistanceHistogram", "DegreeHistogram"]
+
+
+def _histogram(values):
+    """ Format a tally of non-negative integers as "value:count;...". """
+    counts = np.bincount(values)
+    return ";".join("%d:%d" % (v, n) for v, n in enumerate(counts) if n)
+
+
+def analyse(name, shape):
+    """ Statistics record of a puzzle given its name and shape string. """
+    csr = explore_csr([int(i) for i in shape.split(".")])
+    dist = bfs(csr.indptr, csr.indices, [0])
+    diameter, radius, _, _ = extremes(csr)
+    return {"Name": name, "Shape": shape, "Version": VERSION,
+            "States": len(csr.keys), "Edges": len(csr.indices) // 2,
+            "Diameter": diameter, "Radius": radius,
+            "SolvedEccentricity": int(dist.max()),
+            "DistanceHistogram": _histogram(dist),
+            "DegreeHistogram": _histogram(degrees(csr))}
+
+
+def _analyse(row):
+    """ analyse for a (name, shape) pair, picklable for the process pool. """
+    return analyse(*row)
+
+
+def run(database, results, processes=None):
+    """ Analyse all puzzles of a database CSV file, appending a record per
+    puzzle to results CSV file as soon as it is done. Records still valid
+    from previous runs are kept and their puzzles skipped. Returns the
+    number of puzzles analysed. """
+    with open(database) as f:
+        puzzles = [(row["Name"], core.shape_string(
+                   [int(i) for i in row["Shape"].split(".")]))
+                   for row in csv.DictReader(f)]
+    kept = []
+    if os.path.exists(results):
+        with open(results) as f:
+            current = set(puzzles)
+            kept = [row for row in csv.DictReader(f)
+                    if (row["Name"], row["Shape"]) in current and
+                    row["Version"] == str(VERSION)]
+    done = {(row["Name"], row["Shape"]) for row in kept}
+    todo = [p for p in puzzles if p not in done]
+
+    # rewrite the table with valid records only, then stream new ones in
+    tmp = results + ".tmp"
+    with open(tmp, "w", newline="") as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(kept)
+    os.replace(tmp, results)
+    if not todo:
+        return 0
+    with open(results, "a", newline="") as f, mp.Pool(processes) as pool:
+        writer = csv.DictWriter(f, FIELDS)
+        for record in pool.imap_unordered(_analyse, todo):
+            writer.writerow(record)
+            f.flush()
+    return len(todo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyse database puzzles.")
+    parser.add_argument("database")
+    parser.add_argument("results")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+    print(run(args.database, args.results, args.processes),
+          "puzzles analysed")
+
+
+if __name__ == "__main__":
+    main()
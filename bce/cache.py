@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent on-disk cache of explored puzzle graphs: function explore_cached.
+Graphs are stored as CSRGraph arrays in .npy files, one directory per
+initial bandage shape, and are memory-mapped on load.
+"""
+
+import json
+import os
+import numpy as np
+from . import core
+from .export import _staged
+from .graph import CSRGraph, explore_csr
+
+
+# bump whenever turn semantics, key encoding or vertex numbering change, so
+# that stale cache entries get explored again
+VERSION = 1
+_META = "meta.json"
+
+
+def cache_dir():
+    """ Default cache location, the BCE_CACHE_DIR environment variable or
+    .bce_cache in the user's home directory. """
+    return os.environ.get("BCE_CACHE_DIR",
+                          os.path.join(os.path.expanduser("~"), ".bce_cache"))
+
+
+def _entry(initcube, directory):
+    """ Cache entry directory of an initial bandage shape. """
+    return os.path.join(directory if directory else cache_dir(),
+                        core.shape_string(initcube))
+
+
+def load(initcube, directory=None):
+    """ CSRGraph of puzzle explored from initcube with memory-mapped arrays,
+    or None if not cached, cached by a different version or the entry is
+    incomplete. """
+    entry = _entry(initcube, directory)
+    try:
+        with open(os.path.join(entry, _META)) as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION:
+            return None
+        return CSRGraph(*[np.load(os.path.join(entry, field + ".npy"),
+                                  mmap_mode="r")
+                          for field in CSRGraph._fields])
+    except (OSError, ValueError): # missing or damaged entry
+        return None
+
+
+def save(initcube, csr, directory=None):
+    """ Store CSRGraph of puzzle explored from initcube, replacing any
+    previous entry. """
+    with _staged(_entry(initcube, directory)) as tmp:
+        for field, arr in zip(CSRGraph._fields, csr):
+            np.save(os.path.join(tmp, field + ".npy"), arr)
+        with open(os.path.join(tmp, _META), "w") as f:
+            json.dump({"version": VERSION,
+                       "shape": core.shape_string(initcube),
+                       "vertices": len(csr.keys)}, f)
+
+
+def explore_cached(initcube, directory=None):
+    """ CSRGraph of puzzle explored from initcube, loaded from the cache if
+    present there, otherwise explored and stored. Use graph.to_explore or
+    graph.to_networkx to get the usual explore results. """
+    csr = load(initcube, directory)
+    if csr is None:
+        csr = explore_csr(initcube)
+        try:
+            save(initcube, csr, directory)
+        except OSError: # another process stored the entry at the same time
+            pass
+    return csr
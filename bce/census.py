@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+"""
+Census of all bandage shapes, i.e. partitions of the 27 cubies into cuboid
+blocks, 701898882 of them. Run e.g.
+
+    python -m bce.census census
+
+Shapes are deduplicated under the 48 whole cube symmetries, keeping the
+canonical key of each class, see core.canonical_key, and grouped into
+puzzles, the connected components of the shape graph. Enumeration fills
+cells in reading order with cuboids, splitting the search tree into
+subtrees of known size, which worker processes complete as NumPy arrays,
+dropping a shape as soon as one of its images has a smaller key. The
+directory then holds
+
+    keys.u64        sorted canonical keys
+    puzzle.u32      puzzle of each key, numbered by smallest key
+    counts.u8       N x 10 block type multiplicities of each key, COLUMNS
+    puzzles.u64     smallest canonical key of each puzzle
+    sizes.u32       number of canonical keys of each puzzle
+    pcounts.u8      P x 10 block type multiplicities of each puzzle
+
+and query searches puzzles by their block type multiplicities.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+from functools import lru_cache
+import numpy as np
+from . import core
+from .graph import _lookup, blocked_keys, turn_keys
+
+
+VERSION = 1
+# block types as in core.to_dbrecord and database.csv
+COLUMNS = ["Pair", "Clock", "Bar", "BigClock", "Quad", "Fuse2", "Slab",
+           "CBlock", "Fuse3", "BigBlock"]
+_META = "meta.json"
+_FULL = (1 << 27) - 1
+_SYMARRAYS = np.array(core._symtables(core.SYMMETRIES), dtype=np.uint64)
+
+
+def _boxes():
+    """ For each cell, list of (cell mask, bond mask, sorted cells) of cuboids
+    with that cell as their lowest corner. """
+    res = []
+    for i in range(27):
+        a, b, c = i // 9, i // 3 % 3, i % 3
+        boxes = []
+        for x in range(1, 4 - a):
+            for y in range(1, 4 - b):
+                for z in range(1, 4 - c):
+                    cells = {i + 9*dx + 3*dy + dz for dx in range(x)
+                             for dy in range(y) for dz in range(z)}
+                    bonds = sum(1 << n for n, (p, q) in enumerate(core.BONDS)
+                                if p in cells and q in cells)
+                    boxes.append((sum(1 << p for p in cells), bonds,
+                                  sorted(cells)))
+        res.append(boxes)
+    return res
+
+
+_BOXES = _boxes()
+
+
+def _column(cells):
+    """ Index into COLUMNS of the type of a block given by its cells, as
+    core.to_dbrecord classifies it, or None. """
+    facecenter = any(i in cells for i in (4, 10, 12, 14, 16, 22))
+    core_ = 13 in cells
+    return {(2, False): 0, (2, True): 1, (3, False): 2, (3, True): 3,
+            (4, False): 4, (4, True): 5, (6, False): 6, (6, True): 7,
+            (8, False): 8, (8, True): 8, (12, False): 9,
+            (12, True): 9}.get((len(cells), core_ if len(cells) in (4, 6)
+                                else facecenter))
+
+
+def _blocktypes():
+    """ Arrays of inner bond masks, boundary bond masks and columns of all
+    cuboids of more than one cubie counted by core.to_dbrecord. """
+    inner, outer, cols = [], [], []
+    for boxes in _BOXES:
+        for cellmask, bonds, cells in boxes:
+            col = _column(cells)
+            if col is None:
+                continue
+            inner.append(bonds)
+            outer.append(sum(1 << n for n, (p, q) in enumerate(core.BONDS)
+                             if (p in cells) != (q in cells)))
+            cols.append(col)
+    return (np.array(inner, dtype=np.uint64), np.array(outer, dtype=np.uint64),
+            np.array(cols))
+
+
+_INNER, _OUTER, _COLS = _blocktypes()
+
+
+@lru_cache(maxsize=None)
+def _count(occ):
+    """ Number of ways to fill the cells not in bitmask occ with cuboids. """
+    if occ == _FULL:
+        return 1
+    i = (~occ & occ + 1).bit_length() - 1
+    return sum(_count(occ | m) for m, _, _ in _BOXES[i] if not occ & m)
+
+
+def count():
+    """ Number of bandage shapes, without symmetry reduction. """
+    return _count(0)
+
+
+def _subtrees(target, occ=0, key=0):
+    """ Generator of partial fillings (occupied cells, key) whose
+    completions cover every shape exactly once, each with at most target
+    completions unless it can't be split. """
+    if _count(occ) <= target or occ == _FULL:
+        yield occ, key
+        return
+    i = (~occ & occ + 1).bit_length() - 1
+    for m, bonds, _ in _BOXES[i]:
+        if not occ & m:
+            yield from _subtrees(target, occ | m, key | bonds)
+
+
+def _complete(occ, key):
+    """ uint64 array of keys of all completions of a partial filling. """
+    occ, key = np.array([occ], dtype=np.int64), np.array([key], np.uint64)
+    done = []
+    while len(occ):
+        full = occ == _FULL
+        done.append(key[full])
+        occ, key = occ[~full], key[~full]
+        first = np.log2(~occ & occ + 1).astype(np.int64)
+        newocc, newkey = [], []
+        for i in np.unique(first):
+            sel = first == i
+            o, k = occ[sel], key[sel]
+            for m, bonds, _ in _BOXES[i]:
+                fits = o & m == 0
+                newocc.append(o[fits] | m)
+                newkey.append(k[fits] | np.uint64(bonds))
+        occ = np.concatenate(newocc) if newocc else occ[:0]
+        key = np.concatenate(newkey) if newkey else key[:0]
+    return np.concatenate(done)
+
+
+def canonical(keys):
+    """ Boolean array telling which keys of a uint64 array are canonical
+    under all 48 symmetries. """
+    idx = np.arange(len(keys))
+    for t in _SYMARRAYS:
+        idx = idx[_lookup(t, keys[idx]) >= keys[idx]]
+    res = np.zeros(len(keys), dtype=bool)
+    res[idx] = True
+    return res
+
+
+def canonicalize(keys):
+    """ Vectorised core.canonical_key(key, core.SYMMETRIES). """
+    res = keys.copy()
+    for t in _SYMARRAYS:
+        np.minimum(res, _lookup(t, keys), out=res)
+    return res
+
+
+def blockcounts(keys):
+    """ N x 10 uint8 matrix of block type multiplicities (COLUMNS) of
+    shapes given by a uint64 key array, as core.to_dbrecord counts them. """
+    res = np.zeros((len(keys), len(COLUMNS)), dtype=np.uint8)
+    for inner, outer, col in zip(_INNER, _OUTER, _COLS):
+        res[:, col] += (keys & inner == inner) & (keys & outer == 0)
+    return res
+
+
+def _enumerate(seed):
+    """ Sorted canonical keys completing a partial filling. """
+    keys = _complete(*seed)
+    return np.sort(keys[canonical(keys)])
+
+
+def _neighbours(job):
+    """ Pairs of indices into keys.u64 of directory of canonical shapes one
+    quarter turn apart, for keys[lo:hi], and their block counts. """
+    directory, lo, hi = job
+    allkeys = np.memmap(os.path.join(directory, "keys.u64"), np.uint64, "r")
+    keys = np.array(allkeys[lo:hi])
+    blocked = blocked_keys(keys)
+    src, dst = [], []
+    for fi in core.OUTER_FACES:
+        free = np.flatnonzero((blocked >> fi & 1) == 0)
+        for inverse in (False, True):
+            nbr = canonicalize(turn_keys(fi, keys[free], inverse))
+            src.append(free + lo)
+            dst.append(np.searchsorted(allkeys, nbr))
+    pairs = np.unique(np.sort(np.stack([np.concatenate(src),
+                                        np.concatenate(dst)], axis=1)),
+                      axis=0)
+    return pairs[pairs[:, 0] != pairs[:, 1]], blockcounts(keys)
+
+
+def _find(parent, v):
+    """ Vectorised union-find root lookup with path halving. """
+    while True:
+        up = parent[v]
+        if (up == v).all():
+            return v
+        parent[v] = parent[up]
+        v = up
+
+
+def _union(parent, pairs):
+    """ Join sets of union-find forest parent for all index pairs, linking
+    larger roots below smaller ones. """
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        ra, rb = _find(parent, a), _find(parent, b)
+        diff = ra != rb
+        if not diff.any():
+            return
+        a, b = ra[diff], rb[diff]
+        np.minimum.at(parent, np.maximum(a, b), np.minimum(a, b))
+
+
+def run(directory, processes=None, subtree=1 << 21, chunksize=1 << 18):
+    """ Enumerate all bandage shapes into directory, see module docstring,
+    in a pool of worker processes. subtree and chunksize bound the number
+    of shapes per enumeration job and keys per grouping job. Returns the
+    number of canonical shapes and of puzzles. """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "keys.u64")
+    seeds = list(_subtrees(subtree))
+    with mp.Pool(processes) as pool:
+        with open(path + ".tmp", "wb") as f:
+            for keys in pool.imap_unordered(_enumerate, seeds):
+                keys.tofile(f)
+        keys = np.sort(np.fromfile(path + ".tmp", dtype=np.uint64))
+        keys.tofile(path)
+        os.remove(path + ".tmp")
+
+        n = len(keys)
+        parent = np.arange(n, dtype=np.int64)
+        counts = np.zeros((n, len(COLUMNS)), dtype=np.uint8)
+        jobs = [(directory, lo, min(lo + chunksize, n))
+                for lo in range(0, n, chunksize)]
+        for (_, lo, hi), (pairs, cnt) in zip(
+                jobs, pool.imap(_neighbours, jobs)):
+            _union(parent, pairs)
+            counts[lo:hi] = cnt
+    roots = _find(parent, np.arange(n))
+    _, first, puzzle, sizes = np.unique(
+        roots, return_index=True, return_inverse=True, return_counts=True)
+    puzzle.astype(np.uint32).tofile(os.path.join(directory, "puzzle.u32"))
+    counts.tofile(os.path.join(directory, "counts.u8"))
+    keys[first].tofile(os.path.join(directory, "puzzles.u64"))
+    sizes.astype(np.uint32).tofile(os.path.join(directory, "sizes.u32"))
+    counts[first].tofile(os.path.join(directory, "pcounts.u8"))
+    with open(os.path.join(directory, _META), "w") as f:
+        json.dump({"version": VERSION, "shapes": count(), "canonical": n,
+                   "puzzles": len(first), "columns": COLUMNS}, f)
+    return n, len(first)
+
+
+def load(directory):
+    """ Memory-mapped census arrays stored by run: a dictionary with keys,
+    puzzle, counts, puzzles, sizes and pcounts as in the module
+    docstring. """
+    with open(os.path.join(directory, _META)) as f:
+        meta = json.load(f)
+    if meta.get("version") != VERSION:
+        raise Exception("Census made by an incompatible version!")
+
+    def column(name, dtype, shape):
+        return np.memmap(os.path.join(directory, name), dtype=dtype,
+                         mode="r", shape=shape)
+
+    n, p = meta["canonical"], meta["puzzles"]
+    return {"keys": column("keys.u64", np.uint64, (n,)),
+            "puzzle": column("puzzle.u32", np.uint32, (n,)),
+            "counts": column("counts.u8", np.uint8, (n, len(COLUMNS))),
+            "puzzles": column("puzzles.u64", np.uint64, (p,)),
+            "sizes": column("sizes.u32", np.uint32, (p,)),
+            "pcounts": column("pcounts.u8", np.uint8, (p, len(COLUMNS)))}
+
+
+def query(census, **counts):
+    """ Puzzle numbers of a loaded census with given block type
+    multiplicities, e.g. query(census, Quad=2, Fuse3=1). Block types not
+    given may have any multiplicity. Turns move blocks rigidly, so all
+    shapes of a puzzle have the same multiplicities. Use census["puzzles"]
+    for a shape of each and core.key2cube to get its cubelist. """
+    mask = np.ones(len(census["puzzles"]), dtype=bool)
+    for name, value in counts.items():
+        mask &= census["pcounts"][:, COLUMNS.index(name)] == value
+    return np.flatnonzero(mask)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Census of bandage shapes.")
+    parser.add_argument("directory")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args(argv)
+    print("%d canonical shapes in %d puzzles" % run(args.directory,
+                                                    args.processes))
+
+
+if __name__ == "__main__":
+    main()
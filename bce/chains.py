@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Declarative stabilizer / feature chains. A chain is a list of predicates, and
+its layer n + 1 consists of the shapes of layer n satisfying predicate n,
+layer 0 being all shapes of a puzzle. For example the chain
+
+    [same(F, DF), same(R, DR), same(FL, DFL), same(BR, DBR), same(FR, DFR)]
+
+first fixes the F - DF pair, then also the R - DR pair etc. Predicates are
+nested tuples and can be combined with all_of and any_of.
+    Predicates are evaluated on the uint64 key array of a graph.CSRGraph at
+once: as blocks are cuboids, two cubies are in one block iff all bonds along
+a straight-line path between them are present. Layer masks and
+breadth-first distances are cached per chain prefix, so many candidate
+chains sharing prefixes can be compared cheaply, see rank_chains.
+"""
+
+from collections import Counter
+import numpy as np
+from . import core
+from .graph import bfs
+
+
+def same(a, b):
+    """ Predicate: cubies a and b, e.g. core.F and core.DF, are in the same
+    block. """
+    return ("same", a, b)
+
+
+def all_of(*preds):
+    """ Predicate: all of preds hold. """
+    return ("all",) + preds
+
+
+def any_of(*preds):
+    """ Predicate: any of preds holds. """
+    return ("any",) + preds
+
+
+def _pathmask(a, b):
+    """ Key bits of bonds along a path from cubie a to cubie b, moving along
+    one axis at a time. """
+    mask, cur = 0, a
+    for step in (9, 3, 1):
+        while cur // step % 3 != b // step % 3:
+            nxt = cur + step if cur // step % 3 < b // step % 3 else cur - step
+            mask |= 1 << core._BONDINDEX[(min(cur, nxt), max(cur, nxt))]
+            cur = nxt
+    return mask
+
+
+def evaluate(keys, pred):
+    """ Boolean array telling which shapes of a uint64 key array satisfy a
+    predicate. """
+    if pred[0] == "same":
+        mask = np.uint64(_pathmask(pred[1], pred[2]))
+        return keys & mask == mask
+    res = [evaluate(keys, p) for p in pred[1:]]
+    if pred[0] == "all":
+        return np.logical_and.reduce(res) if res else np.ones(len(keys), bool)
+    return np.logical_or.reduce(res) if res else np.zeros(len(keys), bool)
+
+
+def chain_masks(csr, chain, cache=None):
+    """ Boolean vertex masks of all layers of a chain on a CSRGraph. """
+    cache = {} if cache is None else cache
+    masks = [np.ones(len(csr.keys), dtype=bool)]
+    for n in range(len(chain)):
+        prefix = ("mask",) + tuple(chain[:n + 1])
+        if prefix not in cache:
+            cache[prefix] = masks[-1] & evaluate(csr.keys, chain[n])
+        masks.append(cache[prefix])
+    return masks
+
+
+def chain_layers(csr, chain, cache=None):
+    """ Layers of a chain as sets of vertex numbers, as used by
+    core.layers_distance. """
+    return [set(np.flatnonzero(m).tolist())
+            for m in chain_masks(csr, chain, cache)]
+
+
+def chain_distances(csr, chain, tally=False, cache=None):
+    """ Same as core.layers_distance(g, chain_layers(csr, chain), tally=tally)
+    computed in one pass: for each layer the largest distance, or a Counter
+    of distances if tally=True, of its vertices not in the next layer to the
+    next layer. A largest distance of -1 means the next layer is empty.
+    Pass the same cache dictionary to reuse work between chains. """
+    cache = {} if cache is None else cache
+    masks = chain_masks(csr, chain, cache)
+    res = []
+    for n in range(len(chain)):
+        prefix = ("dist",) + tuple(chain[:n + 1])
+        if prefix not in cache:
+            cache[prefix] = bfs(csr.indptr, csr.indices,
+                                np.flatnonzero(masks[n + 1]))
+        d = cache[prefix][masks[n] & ~masks[n + 1]]
+        if tally:
+            res.append(Counter(d.tolist()))
+        elif not masks[n + 1].any():
+            res.append(-1)
+        else:
+            res.append(int(d.max()) if d.size else 0)
+    return res
+
+
+def rank_chains(csr, chains):
+    """ Rank candidate chains for a CSRGraph, best first, by their worst
+    solution step and then by the sum of worst distances over steps. Chains
+    with an empty layer come last. Returns a list of (largest distances,
+    chain) pairs. """
+    cache = {}
+    scored = []
+    for chain in chains:
+        dists = chain_distances(csr, chain, cache=cache)
+        score = ((1, 0, 0) if -1 in dists else
+                 (0, max(dists, default=0), sum(dists)))
+        scored.append((score, dists, chain))
+    scored.sort(key=lambda s: s[0])
+    return [(dists, chain) for _, dists, chain in scored]
@@ -3,10 +3,13 @@
 Core functions for bandaged cube exploration.
 """
 
-import copy
 import re
+import sys
 import networkx as nx
-from collections import Counter
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from time import perf_counter
 
 
 UBL = 0
@@ -49,12 +52,8 @@ FACES = {"L": [a*9 + b*3 + c for a in (0,1,2) for b in (0,1,2) for c in (0,)],
          "D": [a*9 + b*3 + c for a in (2,) for b in (0,1,2) for c in (0,1,2)]}
 
 
-def turnable(face, cube):
-    """ Is a face turnable on a cube? """
-    # turnable if no block spans both the face and its complement
-    faceblocks = set([cube[i] for i in face])
-    restblocks = set([cube[i] for i in set(range(27)) - set(face)])
-    return False if faceblocks & restblocks else True
+FACENAMES = "".join(FACES) # face index i in move tables refers to FACENAMES[i]
+_FACEINDEX = {tuple(face): i for i, face in enumerate(FACES.values())}
 
 
 def _rotate(fc):
@@ -62,22 +61,210 @@ def _rotate(fc):
     return [fc[6], fc[3], fc[0], fc[7], fc[4], fc[1], fc[8], fc[5], fc[2]]
 
 
-def turn(face, cube, fullperm=False):
-    """ Do a single face turn and return the new cube. """
-    facecontent = [cube[i] for i in range(27) if i in face]
-    turned = _rotate(facecontent)
+def _cellperm(face):
+    """ Cubie permutation of a face turn: after the turn, index p holds what
+    was at index _cellperm(face)[p] before it. """
+    perm = list(range(27))
+    turned = _rotate(face)
     if face[0] in [1, 2]: # if R or M face, rotate clockwise as conventional!
         turned = _rotate(_rotate(turned))
-    newcube = copy.deepcopy(cube) # consider list(cube)
     for i, fi in enumerate(face):
-        newcube[fi] = turned[i]
+        perm[fi] = turned[i]
+    return perm
+
+
+_CELLPERMS = [_cellperm(face) for face in FACES.values()]
+
+
+# A bandage shape is fully determined by which pairs of neighbouring cubies
+# are fused together, as blocks are cuboids. There are 54 such "bonds", so a
+# shape packs into a 54-bit integer key, which needs no normalization.
+BONDS = [(i, i + step) for i in range(27) for step, ok in
+         ((1, i % 3 < 2), (3, i % 9 < 6), (9, i < 18)) if ok]
+_BONDINDEX = {bond: b for b, bond in enumerate(BONDS)}
+_BACKBONDS = [[(1 << b, i) for b, (i, j) in enumerate(BONDS) if j == cell]
+              for cell in range(27)]
+
+
+def _crossmask(face):
+    """ Bonds fusing a cubie of the face to a cubie outside of it. """
+    return sum(1 << b for b, (i, j) in enumerate(BONDS)
+               if (i in face) != (j in face))
+
+
+_CROSSMASKS = [_crossmask(face) for face in FACES.values()]
+
+
+def _bondtable(dest):
+    """ Lookup tables moving bond b of a key to bond dest[b], 9 bonds at a
+    time. """
+    return [[sum(1 << dest[9*chunk + k] for k in range(9) if v >> k & 1)
+             for v in range(512)] for chunk in range(6)]
+
+
+def _movetable(fi):
+    """ Lookup tables turning a key by face fi. """
+    perm, face = _CELLPERMS[fi], FACES[FACENAMES[fi]]
+    dest = [0]*len(BONDS) # bond b moves to bond dest[b]
+    for b, (i, j) in enumerate(BONDS):
+        if (i in face) == (j in face):
+            src = tuple(sorted((perm[i], perm[j])))
+            dest[_BONDINDEX[src]] = b
+        else: # crossing bonds are empty whenever the face is turnable
+            dest[b] = b
+    return _bondtable(dest)
+
+
+def _invtable(fi):
+    """ Lookup tables turning a key by face fi anticlockwise. """
+    t = _movetable(fi)
+    dest = [t[b // 9][1 << b % 9].bit_length() - 1
+            for b in range(len(BONDS))]
+    inv = [0]*len(BONDS)
+    for b, d in enumerate(dest):
+        inv[d] = b
+    return _bondtable(inv)
+
+
+_MOVETABLES = [_movetable(fi) for fi in range(len(FACES))]
+_INVTABLES = [_invtable(fi) for fi in range(len(FACES))]
+
+
+# blocked faces bitmask of a shape, bit fi set if face fi can't be turned
+_BLOCKTABLES = [[sum(1 << fi for fi, cross in enumerate(_CROSSMASKS)
+                     if cross >> 9*chunk & v) for v in range(512)]
+                for chunk in range(6)]
+
+
+def cube2key(cube):
+    """ Pack a cubelist into its integer key. Zeros are isolated cubies. """
+    key = 0
+    for b, (i, j) in enumerate(BONDS):
+        if cube[i] == cube[j] and cube[i] != 0:
+            key |= 1 << b
+    return key
+
+
+def key2cube(key):
+    """ Unpack an integer key into a normalized cubelist. """
+    cube = [0]*27
+    blockno = 0
+    for i in range(27):
+        for bit, j in _BACKBONDS[i]:
+            if key & bit:
+                cube[i] = cube[j]
+                break
+        else:
+            blockno += 1
+            cube[i] = blockno
+    return cube
+
+
+# blocked, turn_key and unturn_key inline _permute, as they run once or more
+# per arc of every exploration and the extra call costs several percent
+def blocked(key):
+    """ Bitmask of faces blocked on a shape given by key: bit fi is set iff
+    face FACENAMES[fi] cannot be turned. """
+    t = _BLOCKTABLES
+    return (t[0][key & 511] | t[1][key >> 9 & 511] | t[2][key >> 18 & 511] |
+            t[3][key >> 27 & 511] | t[4][key >> 36 & 511] | t[5][key >> 45])
+
+
+def turn_key(fi, key):
+    """ Turn face with index fi on a shape given by key and return the new
+    key. The face must be turnable. """
+    t = _MOVETABLES[fi]
+    return (t[0][key & 511] | t[1][key >> 9 & 511] | t[2][key >> 18 & 511] |
+            t[3][key >> 27 & 511] | t[4][key >> 36 & 511] | t[5][key >> 45])
+
+
+def unturn_key(fi, key):
+    """ Undo a turn of face with index fi on a shape given by key, i.e. turn
+    it anticlockwise, and return the new key. The face must be turnable. """
+    t = _INVTABLES[fi]
+    return (t[0][key & 511] | t[1][key >> 9 & 511] | t[2][key >> 18 & 511] |
+            t[3][key >> 27 & 511] | t[4][key >> 36 & 511] | t[5][key >> 45])
+
+
+def _permute(t, key):
+    """ Apply lookup tables t to a key. """
+    return (t[0][key & 511] | t[1][key >> 9 & 511] | t[2][key >> 18 & 511] |
+            t[3][key >> 27 & 511] | t[4][key >> 36 & 511] | t[5][key >> 45])
+
+
+def _compose(*perms):
+    """ Cubie permutation of doing perms one after another. """
+    res = list(range(27))
+    for perm in perms:
+        res = [res[i] for i in perm]
+    return res
+
+
+_X = _compose(*[_CELLPERMS[FACENAMES.index(f)] for f in "RMLLL"])
+_Y = _compose(*[_CELLPERMS[FACENAMES.index(f)] for f in "FSB"])
+_Z = _compose(*[_CELLPERMS[FACENAMES.index(f)] for f in "UED"])
+_MIRROR = [i - i % 3 + 2 - i % 3 for i in range(27)] # swaps L and R
+
+
+def _closure(gens):
+    """ All cubie permutations generated by gens, identity first. """
+    res = [tuple(range(27))]
+    for perm in res: # res grows while iterated over
+        for gen in gens:
+            new = tuple(_compose(perm, gen))
+            if new not in res:
+                res.append(new)
+    return res
+
+
+ROTATIONS = _closure([_X, _Y, _Z])                # 24 whole cube rotations
+SYMMETRIES = _closure([_X, _Y, _Z, _MIRROR])      # 48 with mirror images
+_SYMTABLES = {}
+
+
+def _symtables(perms):
+    """ Key lookup tables for a list of whole cube cubie permutations. """
+    res = []
+    for perm in perms:
+        if perm not in _SYMTABLES:
+            dest = [0]*len(BONDS)
+            for b, (i, j) in enumerate(BONDS):
+                dest[_BONDINDEX[tuple(sorted((perm[i], perm[j])))]] = b
+            _SYMTABLES[perm] = _bondtable(dest)
+        res.append(_SYMTABLES[perm])
+    return res
+
+
+def symmetries(key, mirrors=False):
+    """ Whole cube rotations (and mirror images if mirrors=True), as cubie
+    permutations, which leave shape given by key unchanged. """
+    perms = SYMMETRIES if mirrors else ROTATIONS
+    return [perm for perm, t in zip(perms, _symtables(perms))
+            if _permute(t, key) == key]
+
+
+def canonical_key(key, perms=ROTATIONS):
+    """ Canonical representative of a shape's class under a group of whole
+    cube permutations: the minimum key over the images of the shape. """
+    return min(_permute(t, key) for t in _symtables(perms))
+
+
+def turnable(face, cube):
+    """ Is a face turnable on a cube? """
+    # turnable if no block spans both the face and its complement
+    return not blocked(cube2key(cube)) >> _FACEINDEX[tuple(face)] & 1
+
+
+def turn(face, cube, fullperm=False):
+    """ Do a single face turn and return the new cube. """
+    newcube = [cube[i] for i in _CELLPERMS[_FACEINDEX[tuple(face)]]]
     return newcube if fullperm else normalize(newcube)
 
 
 def normalize(cubelist, keepzeros=False):
     """ Normalize a cubelist to get unique bandage shape representation. You
     don't normally need to be calling this. """
-    cube = copy.deepcopy(cubelist)
+    cube = list(cubelist)
     # handle zeros, which represent non-connected cubies, first
     if not keepzeros:
         blockno = 1 + max([1] + cube)
@@ -95,36 +282,283 @@ def normalize(cubelist, keepzeros=False):
         else:
             mapping[v] = blockno
             blockno += 1
-    return list(map(lambda x: mapping[x], cube))
-
-
-def explore(initcube, fullperm=False):
-    """ Breadth-first explore puzzle from given bandage state. """
-    norm = copy.deepcopy(initcube)
-    norm = norm if fullperm else normalize(norm)
-    verts, edges, tovisit = [], [], [norm]
-    edgelabels = {}
-    cube2int, int2cube = {}, {} # bijection for short repre of cube as int
-    cube2int[tuple(norm)] = 0
-    int2cube[0] = norm
-    counter = 0 # counter of discovered vertices used for their short labeling
-
-    while tovisit:
-        cube = tovisit.pop(0)
-        verts.append(cube2int[tuple(cube)])
-        for facename, face in FACES.items():
-            if facename in "UDRLFB" and turnable(face, cube):
-                new = turn(face, cube, fullperm=fullperm)
-                if tuple(new) not in cube2int:
-                    tovisit.append(new)
-                    counter += 1
-                    cube2int[tuple(new)] = counter
-                    int2cube[counter] = new
-                newedge = (cube2int[tuple(cube)], cube2int[tuple(new)])
-                edges.append(newedge)
-                edgelabels[newedge] = edgelabels.get(newedge,"")+facename
-
-    return verts, edges, edgelabels, int2cube, cube2int
+    return [mapping[v] for v in cube]
+
+
+# indices into FACENAMES of the outer faces U, D, R, L, F and B
+OUTER_FACES = [fi for fi, name in enumerate(FACENAMES) if name in "UDRLFB"]
+# (index, name) pairs of outer faces turnable given a blocked faces bitmask
+_FREEFACES = [tuple((fi, FACENAMES[fi]) for fi in OUTER_FACES
+                    if not mask >> fi & 1)
+              for mask in range(1 << len(FACES))]
+
+
+def free_faces(key):
+    """ List (index, name) pairs of outer faces turnable on a shape given by
+    key, in FACES order. """
+    return _FREEFACES[blocked(key)]
+
+
+_PROFILE = None # (stats, callback) of the active profile session
+# key-level functions exploration runs per vertex and arc, and cubelist ones
+_PROFILED = ("blocked", "turn_key", "unturn_key", "cube2key", "key2cube",
+             "turn", "normalize", "turnable")
+
+
+def _report(event, **fields):
+    """ Log an event of the active profile session. """
+    stats, callback = _PROFILE
+    record = dict(event=event, **fields)
+    stats["log"].append(record)
+    if callback is not None:
+        callback(record)
+
+
+def _timed(name, func, stats):
+    """ Wrap func to count its calls and time spent in it. """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats["calls"][name] += 1
+            stats["seconds"][name] += perf_counter() - start
+    return wrapper
+
+
+@contextmanager
+def profile(callback=None):
+    """ Context manager turning instrumentation on, e.g.
+
+        with profile(print) as stats:
+            explore(cube)
+
+    Yields a dictionary with Counters calls and seconds of the functions in
+    _PROFILED, and a list log of event dictionaries, each also passed to
+    callback if given: "layer" after each breadth-first depth of explore,
+    graph.explore_csr or explore_layers (depth, frontier size, states found,
+    elapsed seconds, states/sec and calls made expanding the layer: blocked
+    mask lookups, turn_key and unturn_key turns, each followed by probing
+    the found shapes for its result), "explore" when explore finishes
+    (states, edges, seconds and approximate bytes held by int2cube and
+    cube2int) and "calls" on exit. Fullperm explores permute states without
+    turn_key, so only their blocked lookups are counted. Calls are counted
+    through the module attributes, so names imported by from bce.core
+    import turn are not. Off, the only cost is one check per explore. """
+    global _PROFILE
+    if _PROFILE is not None:
+        raise Exception("Profiling is already on!")
+    stats = {"calls": Counter(), "seconds": Counter(), "log": []}
+    originals = {name: globals()[name] for name in _PROFILED}
+    for name, func in originals.items():
+        globals()[name] = _timed(name, func, stats)
+    _PROFILE = (stats, callback)
+    try:
+        yield stats
+    finally:
+        _report("calls", calls=dict(stats["calls"]),
+                seconds=dict(stats["seconds"]))
+        globals().update(originals)
+        _PROFILE = None
+
+
+def _bfs_order(queue):
+    """ enumerate of a breadth-first queue growing while it is iterated,
+    reporting each finished depth if profiling is on. """
+    return enumerate(queue) if _PROFILE is None else _traced_bfs_order(queue)
+
+
+def _report_layer(depth, frontier, states, t0, calls):
+    """ Report a finished depth of a profiled exploration started at time
+    t0, with the calls made since the call Counter copy calls. """
+    elapsed = perf_counter() - t0
+    _report("layer", depth=depth, frontier=frontier, states=states,
+            seconds=elapsed, rate=states / elapsed if elapsed else None,
+            calls=dict(_PROFILE[0]["calls"] - calls))
+    return _PROFILE[0]["calls"].copy()
+
+
+def _traced_bfs_order(queue):
+    """ _bfs_order when profiling. """
+    start, depth, t0 = 0, 0, perf_counter()
+    calls = _PROFILE[0]["calls"].copy()
+    while start < len(queue):
+        end = len(queue)
+        for v in range(start, end):
+            yield v, queue[v]
+        # the caller has expanded all of the layer when asking for more
+        calls = _report_layer(depth, end - start, len(queue), t0, calls)
+        start, depth = end, depth + 1
+
+
+def _memory(*dicts):
+    """ Approximate bytes held by dictionaries, their keys and values. """
+    return sum(sys.getsizeof(d) + sum(sys.getsizeof(k) + sys.getsizeof(v)
+                                      for k, v in d.items()) for d in dicts)
+
+
+def explore_keys(initkey):
+    """ Breadth-first explore puzzle from bandage state given by its key.
+    Returns verts, edges, edgelabels as explore does, and a list of keys
+    indexed by vertex number. """
+    edges, edgelabels = [], {}
+    int2key, key2int = [initkey], {initkey: 0}
+
+    # int2key doubles as the BFS queue, vertices get numbered on discovery
+    for v, key in _bfs_order(int2key):
+        for fi, facename in _FREEFACES[blocked(key)]:
+            new = turn_key(fi, key)
+            w = key2int.get(new)
+            if w is None:
+                w = key2int[new] = len(int2key)
+                int2key.append(new)
+            edges.append((v, w))
+            edgelabels[(v, w)] = edgelabels.get((v, w), "") + facename
+
+    return list(range(len(int2key))), edges, edgelabels, int2key
+
+
+def explore_symmetric_keys(initkey, mirrors=False):
+    """ Breadth-first explore puzzle from bandage state given by its key,
+    storing only one shape per class of shapes related by a whole cube
+    symmetry of the initial shape. Returns verts, edges, edgelabels and
+    int2key as explore_keys does, but over canonical class representatives,
+    and a list of class sizes indexed by vertex number.
+    Distances from the initial shape are equal for all shapes in a class,
+    so weighting by class sizes gives full graph counts and distance
+    distributions, see expand_tally.
+    Symmetries don't map our face turns to face turns of the same direction,
+    so both directions are explored. An edge label is the move taking the
+    representative of its first vertex into the class of its second. """
+    tables = _symtables(symmetries(initkey, mirrors))
+    def canon(key):
+        images = [_permute(t, key) for t in tables]
+        rep = min(images)
+        return rep, len(tables) // images.count(rep)
+
+    rep, size = canon(initkey)
+    edges, edgelabels = [], {}
+    int2key, key2int, sizes = [rep], {rep: 0}, [size]
+    for v, key in _bfs_order(int2key):
+        for fi, facename in _FREEFACES[blocked(key)]:
+            for new, move in ((turn_key(fi, key), facename),
+                              (unturn_key(fi, key), facename + "'")):
+                w = key2int.get(new)
+                if w is None:
+                    new, size = canon(new)
+                    w = key2int.get(new)
+                    if w is None:
+                        w = key2int[new] = len(int2key)
+                        int2key.append(new)
+                        sizes.append(size)
+                edges.append((v, w))
+                edgelabels[(v, w)] = edgelabels.get((v, w), "") + move
+
+    return list(range(len(int2key))), edges, edgelabels, int2key, sizes
+
+
+def expand_tally(values, sizes):
+    """ Given a dictionary of per vertex values of a symmetry reduced graph,
+    e.g. distances, and class sizes as returned by explore(symmetry=True),
+    count shapes of the full graph for each value. """
+    res = Counter()
+    for v, val in values.items():
+        res[val] += sizes[v]
+    return res
+
+
+def explore_layers(initcube, maxdepth=None, maxstates=None):
+    """ Generator of breadth-first layers of puzzle graph from given bandage
+    state, i.e. shapes at distance 0, 1, 2... from it, for streaming
+    processing or early stopping. Yields tuples (depth, keys, parents,
+    moves), where parents[i] is the key of a shape in the previous layer
+    from which quarter turn moves[i], e.g. "R'", leads to keys[i]. Only the
+    last two layers are kept in memory. Stops after layer maxdepth or after
+    maxstates shapes in total, truncating the last layer, if given. """
+    initkey = cube2key(initcube)
+    previous, current = set(), {initkey: (None, None)}
+    depth, count = 0, 0
+    if _PROFILE is not None:
+        t0, calls = perf_counter(), _PROFILE[0]["calls"].copy()
+    while current:
+        keys = list(current)
+        if maxstates is not None and count + len(keys) > maxstates:
+            keys = keys[:maxstates - count]
+        count += len(keys)
+        yield (depth, keys, [current[k][0] for k in keys],
+               [current[k][1] for k in keys])
+        if (maxdepth is not None and depth >= maxdepth or
+                maxstates is not None and count >= maxstates):
+            return
+        new = {}
+        for key in current:
+            for fi, facename in _FREEFACES[blocked(key)]:
+                for nbr, move in ((turn_key(fi, key), facename),
+                                  (unturn_key(fi, key), facename + "'")):
+                    if (nbr not in current and nbr not in previous and
+                            nbr not in new):
+                        new[nbr] = (key, move)
+        if _PROFILE is not None:
+            calls = _report_layer(depth, len(current), count + len(new), t0,
+                                  calls)
+        previous, current = current, new
+        depth += 1
+
+
+def _explore_fullperm(initcube):
+    """ Breadth-first explore tracking individual blocks, see explore. """
+    init = tuple(initcube)
+    edges, edgelabels = [], {}
+    int2state, state2int = [init], {init: 0}
+    for v, state in _bfs_order(int2state):
+        for fi, facename in _FREEFACES[blocked(cube2key(state))]:
+            new = tuple([state[i] for i in _CELLPERMS[fi]])
+            w = state2int.get(new)
+            if w is None:
+                w = state2int[new] = len(int2state)
+                int2state.append(new)
+            edges.append((v, w))
+            edgelabels[(v, w)] = edgelabels.get((v, w), "") + facename
+    int2cube = {v: list(state) for v, state in enumerate(int2state)}
+    return list(range(len(int2state))), edges, edgelabels, int2cube, state2int
+
+
+def explore(initcube, fullperm=False, symmetry=False, mirrors=False,
+            compact=False):
+    """ Breadth-first explore puzzle from given bandage state.
+    If compact=True, return a graph.CSRGraph of NumPy arrays instead, see
+    graph.explore_csr.
+    If symmetry=True, shapes related by a whole cube rotation (or mirror
+    image too if mirrors=True) preserving the initial shape are explored as
+    one vertex, see explore_symmetric_keys. A list of class sizes indexed by
+    vertex number is then returned as an extra last element. Find a class
+    representative of a shape by canonical_key(cube2key(cube), perms) where
+    perms = symmetries(cube2key(initcube), mirrors). """
+    if fullperm and symmetry:
+        raise Exception("Symmetry reduction is not supported with fullperm!")
+    if compact and (fullperm or symmetry):
+        raise Exception("Compact output is supported for plain exploration!")
+    if compact:
+        from .graph import explore_csr
+        return explore_csr(initcube)
+    start = perf_counter()
+    if fullperm:
+        res = _explore_fullperm(initcube)
+    elif symmetry:
+        verts, edges, edgelabels, int2key, sizes = explore_symmetric_keys(
+            cube2key(initcube), mirrors)
+    else:
+        verts, edges, edgelabels, int2key = explore_keys(cube2key(initcube))
+    if not fullperm:
+        int2cube = {v: key2cube(key) for v, key in enumerate(int2key)}
+        cube2int = {tuple(cube): v for v, cube in int2cube.items()}
+        res = (verts, edges, edgelabels, int2cube, cube2int)
+        res += (sizes,) if symmetry else ()
+    if _PROFILE is not None:
+        _report("explore", states=len(res[0]), edges=len(res[1]),
+                seconds=perf_counter() - start, memory=_memory(*res[3:5]))
+    return res
 
 
 def shortest_path(g, mixed, solved, labels, c2i):
@@ -134,11 +568,20 @@ def shortest_path(g, mixed, solved, labels, c2i):
     cubelists or integers. Output is in standard move notation. """
     vfrom = mixed if type(mixed) == int else c2i[tuple(normalize(mixed))]
     vto = solved if type(solved) == int else c2i[tuple(normalize(solved))]
-    path = nx.dijkstra_path(g, vfrom, vto)
-    path = zip(path, path[1:])
+    return _path_moves(nx.dijkstra_path(g, vfrom, vto), labels)
+
+
+def _path_moves(path, labels):
+    """ Move notation for a path given by its list of vertices. """
+    return join_moves(labels[e] if e in labels else labels[(e[1], e[0])] + "'"
+                      for e in zip(path, path[1:]))
+
+
+def join_moves(moves):
+    """ Join a sequence of quarter turns like "R", "U'" into standard move
+    notation, writing repeated quarter turns as half turns. """
     res = ["dummy"]
-    for e in path:
-        new = labels[e] if e in labels else labels[(e[1], e[0])] + "'"
+    for new in moves:
         if res[-1] == new:
             res[-1] = res[-1][0] + "2"
         else:
@@ -146,82 +589,168 @@ def shortest_path(g, mixed, solved, labels, c2i):
     return " ".join(res[1:])
 
 
+_ROTATIONPERMS = {"x": _X, "y": _Y, "z": _Z}
+_MOVE = re.compile(r"\s*([UDRLFBESMxyz])(2|')?")
+
+
+@lru_cache(maxsize=1024)
+def compile_moves(moves):
+    """ Parse a move sequence in standard notation once into a tuple of
+    steps for do and graph.do_keys. A step is either (face index, quarter
+    turns 1..3) or (None, key lookup tables) for a whole cube rotation,
+    consecutive rotations being composed into one. """
+    steps, rotation, pos = [], None, 0
+    moves = moves.rstrip()
+    while pos < len(moves):
+        match = _MOVE.match(moves, pos)
+        if not match:
+            raise Exception("Cannot parse moves at: " + moves[pos:])
+        pos = match.end()
+        move, suffix = match.groups()
+        times = {None: 1, "2": 2, "'": 3}[suffix]
+        if move in _ROTATIONPERMS:
+            rotation = _compose(*([rotation] if rotation else []) +
+                                [_ROTATIONPERMS[move]]*times)
+            continue
+        if rotation:
+            steps.append((None, _symtables([tuple(rotation)])[0]))
+            rotation = None
+        steps.append((FACENAMES.index(move), times))
+    if rotation:
+        steps.append((None, _symtables([tuple(rotation)])[0]))
+    return tuple(steps)
+
+
+def do_key(key, moves):
+    """ Execute a move sequence in standard notation on shape given by key
+    and return resulting key. If impossible because of bandaging raises
+    exception. """
+    for fi, arg in compile_moves(moves):
+        if fi is None: # whole cube rotation
+            key = _permute(arg, key)
+            continue
+        if key & _CROSSMASKS[fi]:
+            raise Exception(" ".join(["Face", FACENAMES[fi],
+                                      "cannot be turned!"]))
+        if arg == 3:
+            key = unturn_key(fi, key)
+        else:
+            for _ in range(arg):
+                key = turn_key(fi, key)
+    return key
+
+
 def do(cube, moves):
     """ Execute a move sequence in standard notation on given cube and return
     result. If impossible because of bandaging raises exception. """
-    res = normalize(copy.deepcopy(cube))
-    # unravel X2s and X's
-    moves = re.sub("([UDRLFBESMxyz])2", r"\1 \1", moves)
-    moves = re.sub("([UDRLFBESMxyz])'", r"\1 \1 \1", moves)
-    for move in moves.split():
-        if move == "x":
-            res = turn(FACES["R"], res)
-            res = turn(FACES["M"], res)
-            res = turn(FACES["L"], turn(FACES["L"], turn(FACES["L"], res)))
-        if move == "y":
-            res = turn(FACES["F"], res)
-            res = turn(FACES["S"], res)
-            res = turn(FACES["B"], res)
-        if move == "z":
-            res = turn(FACES["U"], res)
-            res = turn(FACES["E"], res)
-            res = turn(FACES["D"], res)
-
-        if move not in "UDRLFBESM":
-            continue
-        face = FACES[move]
-        if not turnable(face, res):
-            raise Exception(" ".join(["Face", move, "cannot be turned!"]))
-        res = turn(face, res)
-    return res
+    return key2cube(do_key(cube2key(cube), moves))
+
+
+# indptr, indices: compact adjacency of a graph, see graph.adjacency, nodes:
+# its vertices in that order, index: vertex -> position, dists[n]: array of
+# distances from the nearest vertex of layers[n] by position, -1 if none
+LayerDists = namedtuple("LayerDists", ["indptr", "indices", "nodes", "index",
+                                       "dists"])
+
+
+def layer_dists(g, layers):
+    """ Distances in graph g from each of layers, by one multi-source
+    breadth-first search per layer, as LayerDists. Pass it as dist to
+    layers_distance, dist_to_next_layer and path_to_next_layer to share the
+    searches between calls; compute it anew after changing g or layers. """
+    from .graph import adjacency, bfs
+    indptr, indices, nodes = adjacency(g)
+    index = {v: i for i, v in enumerate(nodes)}
+    return LayerDists(indptr, indices, nodes, index,
+                      [bfs(indptr, indices, [index[v] for v in layer])
+                       for layer in layers])
+
+
+def _to_layer(dist, n, v):
+    """ Distance of vertex v from layers[n] by LayerDists dist. """
+    d = int(dist.dists[n][dist.index[v]])
+    if d < 0:
+        raise Exception("Vertex %r cannot reach layer %d!" % (v, n))
+    return d
 
 
 def layers_distance(g, layers, dist=None, tally=False):
     """ Calculates either the largest shortest distance, or a full distribution
     of distances (if tally=True), between a vertex from layer[i] and a vertex
     from layer[i + 1] in graph g, for all consecutive layer pairs.
-    If dictionary of distances dist is not supplied, it is calculated as
-    nx.shortest_path_length(g).
+    dist is a dictionary of distances or LayerDists, see layer_dists. If not
+    supplied, one breadth-first search from all of layer[i + 1] at once is
+    run for each i, which needs no all-pairs distance table. g may be a
+    networkx Graph or graph.CSRGraph.
     This function is typically called to assess feasibility of cube solving
     via a particular stabilizer chain / feature chain. """
-    d = nx.shortest_path_length(g) if not dist else dist
     fnc = Counter if tally else max
-    return [fnc(min(d[i][j] for j in layers[n + 1])
-                for i in layers[n] - layers[n + 1])
-                for n in range(len(layers) - 1)]
+    if dist and not isinstance(dist, LayerDists):
+        return [fnc(min(dist[i][j] for j in layers[n + 1])
+                    for i in layers[n] - layers[n + 1])
+                    for n in range(len(layers) - 1)]
+    if not dist:
+        dist = layer_dists(g, [set()] + layers[1:])
+    return [fnc(_to_layer(dist, n + 1, i) for i in layers[n] - layers[n + 1])
+            for n in range(len(layers) - 1)]
+
+
+def _next_layer(v, layers):
+    """ Index of the first layer not containing v, None if there is none. """
+    try:
+        return [v in layer for layer in layers].index(False)
+    except ValueError:
+        print("Vertex lies in final layer!")
+        return None
 
 
 def path_to_next_layer(g, v, layers, dist, labels, c2i):
     """ For a graph, its vertex and layering, output shortest path from vertex
-    to the next layer. """
-    try:
-        ind = [v in layer for layer in layers].index(False)
-    except ValueError:
-        print("Vertex lies in final layer!")
+    to the next layer. dist may be None or LayerDists, see
+    dist_to_next_layer; the path then descends the distances to the next
+    layer from v. """
+    ind = _next_layer(v, layers)
+    if ind is None:
         return
-    mindist = min(dist[v][w] for w in layers[ind])
-    verts = [w for w in layers[ind] if dist[v][w] == mindist]
-    return shortest_path(g, v, verts[0], labels, c2i)
-
-    
-def dist_to_next_layer(g, v, layers, dist):
+    if dist and not isinstance(dist, LayerDists):
+        d = {w: dist[v][w] for w in layers[ind]}
+        mindist = min(d.values())
+        verts = [w for w in layers[ind] if d[w] == mindist]
+        return shortest_path(g, v, verts[0], labels, c2i)
+    if not dist:
+        dist = layer_dists(g, [set()]*ind + [layers[ind]])
+    _to_layer(dist, ind, v)
+    d, indptr, indices = dist.dists[ind], dist.indptr, dist.indices
+    path = [dist.index[v]]
+    while d[path[-1]] > 0:
+        nbrs = indices[indptr[path[-1]]:indptr[path[-1] + 1]]
+        path.append(int(nbrs[d[nbrs] == d[path[-1]] - 1][0]))
+    return _path_moves([dist.nodes[i] for i in path], labels)
+
+
+def dist_to_next_layer(g, v, layers, dist=None):
     """ For a graph, its vertex and layering, output vertex distance from its
     current layer to the next layer. dist is a pre-computed graph distances
-    dictionary, e.g. by dist = nx.shortest_path_length(g). """
-    try:
-        ind = [v in layer for layer in layers].index(False)
-    except ValueError:
-        print("Vertex lies in final layer!")
+    dictionary, e.g. by dist = nx.shortest_path_length(g), or LayerDists,
+    see layer_dists, which is much cheaper when asking for many vertices. If
+    not supplied, one breadth-first search from the whole next layer is
+    run. """
+    ind = _next_layer(v, layers)
+    if ind is None:
         return
-    return min(dist[v][w] for w in layers[ind])
+    if dist and not isinstance(dist, LayerDists):
+        return min(dist[v][w] for w in layers[ind])
+    if not dist:
+        dist = layer_dists(g, [set()]*ind + [layers[ind]])
+    return _to_layer(dist, ind, v)
 
 
 def nbrrep(cube):
-    """ Turns a standard cubelist into a list of neighborhood connectivity
-    vectors for cubies. """
-    ncube = normalize(cube)
+    """ Turns a standard cubelist into a flat list of neighborhood
+    connectivity vectors for cubies, 6 entries per cubie. """
+    cube = normalize(cube)
     res = []
-    for i, b in enumerate(ncube):
+    for i, b in enumerate(cube):
         vector = []
         vector.append(1 if i % 3 < 2  and cube[i] == cube[i+1] else 0) # R
         vector.append(1 if i % 3 > 0  and cube[i] == cube[i-1] else 0) # L
@@ -234,19 +763,28 @@ def nbrrep(cube):
 
 
 def similarity(nbrcube1, nbrcube2):
-    """ Hamming distance based similarity of nbrreps of cubelists. """
-    flat1 = [y for x in nbrcube1 for y in x]
-    flat2 = [y for x in nbrcube2 for y in x]
-    return (sum(c1 == c2 for c1, c2 in zip(flat1, flat2)) - 54) / (162 - 54)
+    """ Hamming distance based similarity of nbrreps of cubelists. The 54
+    entries for neighbours outside of the cube always match and don't
+    count. """
+    matches = sum(c1 == c2 for c1, c2 in zip(nbrcube1, nbrcube2))
+    return (matches - 54) / (162 - 54)
+
+
+def shape_string(cube):
+    """ Unique string representation of a bandage shape as used in the
+    database, e.g. 1.1.0.1.1.0.0.0.0.2.2.3..., with 1x1x1 cubies as zeros. """
+    norm = normalize(cube)
+    single = [norm.count(v) == 1 for v in norm]
+    return ".".join(str(i) for i in normalize(
+        [0 if s else v for v, s in zip(norm, single)], keepzeros=True))
 
 
 def to_dbrecord(cube):
     """ Transform a cube into a database.csv record. Most notably calculate
     the multiplicity of the various bandaged block types so that nice
     database searches by filtering on them can be done. """
-    norm = copy.deepcopy(cube)
-    norm = normalize(norm)
-    shape = ".".join(str(i) for i in normalize(cube, keepzeros=True))
+    norm = normalize(cube)
+    shape = shape_string(cube)
     pair = clock = bar = bigclock = quad = fuse2 = slab = cblock = fuse3 = 0
     bigblock = 0
     for blockno in range(1, max(norm) + 1):
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Out-of-core breadth-first exploration for puzzle graphs too big for memory:
+function explore_disk. Each distance layer is stored as a sorted file of
+shape keys, and exploration can be resumed after every completed layer.
+"""
+
+import glob
+import json
+import os
+import numpy as np
+from . import core
+from .graph import blocked_keys, turn_keys
+
+
+VERSION = 1
+_STATE = "state.json"
+
+
+def _layerpath(directory, n):
+    """ File holding layer n of an exploration. """
+    return os.path.join(directory, "layer_%04d.u64" % n)
+
+
+def layer(directory, n):
+    """ Sorted uint64 array of keys of shapes at distance n from the initial
+    shape, memory-mapped from a directory written by explore_disk. """
+    path = _layerpath(directory, n)
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=np.uint64)
+    return np.memmap(path, dtype=np.uint64, mode="r")
+
+
+def _neighbours(keys):
+    """ Keys of all shapes one quarter turn away from shapes in keys. """
+    blocked = blocked_keys(keys)
+    res = []
+    for fi in core.OUTER_FACES:
+        free = keys[(blocked >> fi & 1) == 0]
+        res.append(turn_keys(fi, free))
+        res.append(turn_keys(fi, free, inverse=True))
+    return np.concatenate(res)
+
+
+def _without(cands, known, lo, hi):
+    """ Drop from sorted unique cands, all in key range [lo, hi), those
+    present in sorted array known. """
+    i, j = np.searchsorted(known, [lo, hi])
+    return cands[~np.isin(cands, known[i:j], assume_unique=True)]
+
+
+def _save_state(directory, initkey, sizes, done):
+    """ Atomically checkpoint exploration progress. """
+    tmp = os.path.join(directory, _STATE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({"version": VERSION, "initkey": initkey, "sizes": sizes,
+                   "done": done}, f)
+    os.replace(tmp, os.path.join(directory, _STATE))
+
+
+def explore_disk(initcube, directory, chunksize=1 << 20, bucketbits=6):
+    """ Breadth-first explore puzzle from given bandage state keeping only a
+    chunk of keys in memory at a time. Returns the list of numbers of shapes
+    at each distance from the initial shape; the shapes themselves are
+    written to directory, one sorted key file per distance, see layer.
+        In an undirected graph, neighbours of layer n lie in layers n - 1, n
+    and n + 1 only. Neighbours of layer n are thus written chunk by chunk
+    into 2**bucketbits bucket files by key range, and each bucket is then
+    sorted, deduplicated and merged against layers n - 1 and n on its own.
+        Progress is checkpointed after each layer, calling again with the
+    same directory and initial shape resumes an interrupted exploration. """
+    os.makedirs(directory, exist_ok=True)
+    initkey = core.cube2key(initcube)
+    statepath = os.path.join(directory, _STATE)
+    sizes, done = [], False
+    if os.path.exists(statepath):
+        with open(statepath) as f:
+            state = json.load(f)
+        if state["version"] != VERSION or state["initkey"] != initkey:
+            raise Exception("Directory holds a different exploration!")
+        sizes, done = state["sizes"], state["done"]
+    for path in glob.glob(os.path.join(directory, "*.tmp")):
+        os.remove(path)
+    if not sizes:
+        np.array([initkey], dtype=np.uint64).tofile(_layerpath(directory, 0))
+        sizes = [1]
+        _save_state(directory, initkey, sizes, False)
+
+    shift = 54 - bucketbits
+    while not done:
+        n = len(sizes) - 1
+        current = layer(directory, n)
+        previous = layer(directory, n - 1) if n else current[:0]
+        bucketpaths = [os.path.join(directory, "bucket_%04d.tmp" % b)
+                       for b in range(1 << bucketbits)]
+        buckets = [open(path, "wb") for path in bucketpaths]
+        try:
+            for start in range(0, len(current), chunksize):
+                cands = np.unique(_neighbours(
+                    np.array(current[start:start + chunksize])))
+                bounds = np.searchsorted(cands >> np.uint64(shift), np.arange(
+                    (1 << bucketbits) + 1, dtype=np.uint64))
+                for b, f in enumerate(buckets):
+                    cands[bounds[b]:bounds[b + 1]].tofile(f)
+        finally:
+            for f in buckets:
+                f.close()
+
+        newpath = _layerpath(directory, n + 1) + ".tmp"
+        size = 0
+        with open(newpath, "wb") as out:
+            for b, path in enumerate(bucketpaths):
+                cands = np.unique(np.fromfile(path, dtype=np.uint64))
+                lo, hi = np.uint64(b << shift), np.uint64(b + 1 << shift)
+                cands = _without(cands, current, lo, hi)
+                cands = _without(cands, previous, lo, hi)
+                cands.tofile(out)
+                size += len(cands)
+                os.remove(path)
+        os.replace(newpath, _layerpath(directory, n + 1))
+        if size:
+            sizes.append(size)
+        else:
+            os.remove(_layerpath(directory, n + 1))
+            done = True
+        _save_state(directory, initkey, sizes, done)
+
+    return sizes
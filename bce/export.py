@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+Graph export and import. save streams the results of explore in chunks into
+a directory of raw binary columns:
+
+    src, dst      edge endpoints, uint32 (uint64 for huge graphs)
+    label         edge label codes indexing the label list in meta.json
+    states.u8     cubelists of vertices, 27 bytes each
+    sizes.u32     symmetry class sizes, if explored with symmetry=True
+
+and load reads them back into the same structures. write_edgelist and
+write_graphml stream text formats for visualisation tools like Gephi.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from itertools import islice
+import numpy as np
+
+
+VERSION = 1
+_META = "meta.json"
+
+
+def _chunks(iterable, chunksize):
+    """ Generator of lists of consecutive items of iterable. """
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, chunksize))
+        if not chunk:
+            return
+        yield chunk
+
+
+@contextmanager
+def _staged(directory):
+    """ Context manager yielding a new temporary directory next to directory
+    to write into, meta.json last, which then replaces directory, or is
+    removed if writing fails. Each call gets its own temporary directory,
+    so concurrent writers can't mix files; one may fail with OSError when
+    another's directory appears in between. Also used by the cache and
+    index modules. """
+    directory = directory.rstrip("/\\")
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=os.path.basename(directory) + ".",
+                           suffix=".tmp", dir=parent)
+    try:
+        yield tmp
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp, directory)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def save(explored, directory, chunksize=1 << 20):
+    """ Store a tuple returned by core.explore, i.e. verts, edges,
+    edgelabels, int2cube, cube2int and possibly symmetry class sizes, in
+    directory, replacing its previous contents. Memory use apart from the
+    inputs is bounded by chunksize edges or vertices. """
+    verts, edges, edgelabels, int2cube = explored[:4]
+    sizes = explored[5] if len(explored) > 5 else None
+    vdtype = np.uint32 if len(verts) < 1 << 32 else np.uint64
+    with _staged(directory) as tmp:
+        codes, nedges = {}, 0
+        with open(os.path.join(tmp, "src"), "wb") as fs, \
+             open(os.path.join(tmp, "dst"), "wb") as fd, \
+             open(os.path.join(tmp, "label"), "wb") as fl:
+            for chunk in _chunks(edges, chunksize):
+                arr = np.array(chunk, dtype=vdtype).reshape(-1, 2)
+                arr[:, 0].tofile(fs)
+                arr[:, 1].tofile(fd)
+                np.array([codes.setdefault(edgelabels[e], len(codes))
+                          for e in chunk], dtype=np.uint32).tofile(fl)
+                nedges += len(chunk)
+        with open(os.path.join(tmp, "states.u8"), "wb") as f:
+            for chunk in _chunks(verts, chunksize):
+                np.array([int2cube[v] for v in chunk],
+                         dtype=np.uint8).tofile(f)
+        if sizes is not None:
+            np.array(sizes, dtype=np.uint32).tofile(
+                os.path.join(tmp, "sizes.u32"))
+        with open(os.path.join(tmp, _META), "w") as f:
+            json.dump({"version": VERSION, "vertices": len(verts),
+                       "edges": nedges, "vdtype": np.dtype(vdtype).name,
+                       "labels": sorted(codes, key=codes.get),
+                       "symmetry": sizes is not None}, f)
+
+
+def load_arrays(directory):
+    """ Memory-mapped columns of a graph stored by save: a dictionary with
+    NumPy arrays src, dst, label (codes), states (N x 27), sizes (None
+    unless explored with symmetry=True) and the list labels of label
+    strings. """
+    with open(os.path.join(directory, _META)) as f:
+        meta = json.load(f)
+    if meta.get("version") != VERSION:
+        raise Exception("Graph stored by an incompatible version!")
+
+    def column(name, dtype, shape):
+        if not shape[0]: # empty files can't be memory-mapped
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(os.path.join(directory, name), dtype=dtype,
+                         mode="r", shape=shape)
+
+    n, m = meta["vertices"], meta["edges"]
+    return {"src": column("src", meta["vdtype"], (m,)),
+            "dst": column("dst", meta["vdtype"], (m,)),
+            "label": column("label", np.uint32, (m,)),
+            "states": column("states.u8", np.uint8, (n, 27)),
+            "sizes": column("sizes.u32", np.uint32, (n,))
+                     if meta["symmetry"] else None,
+            "labels": meta["labels"]}
+
+
+def load(directory):
+    """ Load a graph stored by save back into the tuple core.explore
+    returned. """
+    cols = load_arrays(directory)
+    verts = list(range(len(cols["states"])))
+    edges = list(zip(cols["src"].tolist(), cols["dst"].tolist()))
+    names = cols["labels"]
+    edgelabels = {e: names[code]
+                  for e, code in zip(edges, cols["label"].tolist())}
+    int2cube = dict(enumerate(cols["states"].tolist()))
+    cube2int = {tuple(cube): v for v, cube in int2cube.items()}
+    res = (verts, edges, edgelabels, int2cube, cube2int)
+    if cols["sizes"] is not None:
+        res += (cols["sizes"].tolist(),)
+    return res
+
+
+def write_edgelist(path, edges, edgelabels, delimiter=",",
+                   chunksize=1 << 16):
+    """ Write edges as lines "v,w,label", as for Gephi spreadsheet import. """
+    with open(path, "w") as f:
+        for chunk in _chunks(edges, chunksize):
+            f.writelines("%d%s%d%s%s\n" % (v, delimiter, w, delimiter,
+                                           edgelabels[(v, w)])
+                         for v, w in chunk)
+
+
+def write_graphml(path, verts, edges, edgelabels, int2cube=None,
+                  chunksize=1 << 16):
+    """ Write an undirected GraphML file with edge attribute label and, if
+    int2cube is given, vertex attribute shape, the cubelist joined by dots
+    as in the puzzle database. """
+    with open(path, "w") as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+                '<key id="shape" for="node" attr.name="shape" '
+                'attr.type="string"/>\n'
+                '<key id="label" for="edge" attr.name="label" '
+                'attr.type="string"/>\n'
+                '<graph edgedefault="undirected">\n')
+        for chunk in _chunks(verts, chunksize):
+            if int2cube is None:
+                f.writelines('<node id="%d"/>\n' % v for v in chunk)
+            else:
+                f.writelines('<node id="%d"><data key="shape">%s</data>'
+                             '</node>\n' % (v, ".".join(map(str, int2cube[v])))
+                             for v in chunk)
+        for chunk in _chunks(edges, chunksize):
+            f.writelines('<edge source="%d" target="%d"><data key="label">'
+                         '%s</data></edge>\n' % (v, w, edgelabels[(v, w)])
+                         for v, w in chunk)
+        f.write("</graph>\n</graphml>\n")
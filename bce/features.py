@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorised neighbourhood connectivity features of many bandage shapes at
+once: batched core.nbrrep and core.similarity over NumPy arrays.
+
+Entry 6*i + k of an nbrrep is the bond between cubie i and its neighbour in
+direction k (R, L, F, B, D, U), so an nbrrep holds every bond of a shape key
+twice and similarity of two shapes only depends on how many bonds they
+differ in.
+"""
+
+import numpy as np
+from . import core
+
+
+def _columns():
+    """ Key bit of the bond behind each nbrrep entry, -1 where there is no
+    neighbour. """
+    cols = []
+    for i in range(27):
+        for step, ok in ((1, i % 3 < 2), (-1, i % 3 > 0), (3, i % 9 < 6),
+                         (-3, i % 9 > 2), (9, i < 18), (-9, i > 8)):
+            bond = (min(i, i + step), max(i, i + step))
+            cols.append(core._BONDINDEX[bond] if ok else -1)
+    return np.array(cols)
+
+
+_COLUMNS = _columns()
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def as_keys(shapes):
+    """ uint64 key array of shapes, given as a list of cubelists or already
+    as keys. """
+    if isinstance(shapes, np.ndarray) and shapes.dtype == np.uint64:
+        return shapes
+    if len(shapes) and hasattr(shapes[0], "__len__"):
+        return np.array([core.cube2key(c) for c in shapes], dtype=np.uint64)
+    return np.asarray(shapes, dtype=np.uint64)
+
+
+def nbrreps(shapes, packed=False):
+    """ N x 162 uint8 matrix whose rows are core.nbrrep of given shapes, a
+    list of cubelists or a key array. If packed=True, rows are bit-packed
+    into 21 bytes each by np.packbits. """
+    keys = as_keys(shapes)
+    valid = _COLUMNS >= 0
+    bits = np.where(valid, _COLUMNS, 0).astype(np.uint64)
+    res = (keys[:, None] >> bits[None, :] & np.uint64(1)).astype(np.uint8)
+    res[:, ~valid] = 0
+    return np.packbits(res, axis=1) if packed else res
+
+
+def _popcount(x):
+    """ Number of set bits of each element of a uint64 array. """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def similarities(shape, shapes):
+    """ Array of core.similarity of nbrreps of one shape (a cubelist or key)
+    and each of shapes (a list of cubelists or a key array). """
+    key = np.uint64(shape if isinstance(shape, (int, np.integer))
+                    else core.cube2key(shape))
+    diff = _popcount(as_keys(shapes) ^ key).astype(np.float64)
+    # each differing bond gives two differing nbrrep entries out of 108
+    return 1 - diff / 54
+
+
+def nearest(shape, shapes, k=10):
+    """ Indices into shapes of the k shapes most similar to shape, most
+    similar first, and their similarities. """
+    sims = similarities(shape, shapes)
+    k = min(k, len(sims))
+    top = np.argpartition(-sims, k - 1)[:k] if k else np.zeros(0, int)
+    top = top[np.argsort(-sims[top], kind="stable")]
+    return top, sims[top]
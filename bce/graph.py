@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Compact array representation of explored puzzle graphs: a NumPy CSR
+adjacency with one byte move labels and a table of shape keys.
+"""
+
+from array import array
+from collections import namedtuple
+import networkx as nx
+import numpy as np
+from . import core
+
+
+# arc label l means quarter turn MOVENAMES[l], anticlockwise turns come after
+# all clockwise ones
+MOVENAMES = list(core.FACENAMES) + [f + "'" for f in core.FACENAMES]
+INVERSE = len(core.FACES)
+
+_MOVEARRAYS = np.array(core._MOVETABLES, dtype=np.uint64)
+_INVARRAYS = np.array(core._INVTABLES, dtype=np.uint64)
+_BLOCKARRAYS = np.array(core._BLOCKTABLES, dtype=np.uint16)
+
+# keys: uint64 shape keys indexed by vertex number, same numbering as explore
+# indptr, indices: arcs of vertex v go to indices[indptr[v]:indptr[v + 1]],
+# both turn directions are present so the adjacency is symmetric
+# labels: uint8 arc labels parallel to indices, see MOVENAMES
+CSRGraph = namedtuple("CSRGraph", ["keys", "indptr", "indices", "labels"])
+
+
+def _lookup(t, keys):
+    """ Apply chunked lookup tables t to an array of keys. """
+    res = t[0][keys & np.uint64(511)]
+    for chunk in range(1, 6):
+        res |= t[chunk][keys >> np.uint64(9*chunk) & np.uint64(511)]
+    return res
+
+
+def turn_keys(fi, keys, inverse=False):
+    """ Vectorised core.turn_key (or core.unturn_key if inverse=True) for a
+    uint64 array of keys, all of which must have face fi turnable. """
+    return _lookup(_INVARRAYS[fi] if inverse else _MOVEARRAYS[fi], keys)
+
+
+def blocked_keys(keys):
+    """ Vectorised core.blocked for a uint64 array of keys. """
+    return _lookup(_BLOCKARRAYS, keys)
+
+
+def do_keys(keys, moves):
+    """ Execute a move sequence in standard notation on each shape of a
+    uint64 key array at once, see core.do. Returns the array of resulting
+    keys and a boolean array telling for which shapes the sequence was
+    possible; results of impossible ones are meaningless. """
+    keys = np.array(keys, dtype=np.uint64)
+    legal = np.ones(len(keys), dtype=bool)
+    for fi, arg in core.compile_moves(moves):
+        if fi is None: # whole cube rotation
+            keys = _lookup(np.array(arg, dtype=np.uint64), keys)
+            continue
+        legal &= (blocked_keys(keys) >> fi & 1) == 0
+        if arg == 3:
+            keys = turn_keys(fi, keys, inverse=True)
+        else:
+            for _ in range(arg):
+                keys = turn_keys(fi, keys)
+    return keys, legal
+
+
+def explore_csr(initcube):
+    """ Breadth-first explore puzzle from given bandage state like explore
+    does, but return a CSRGraph, using a few bytes per edge. """
+    src, dst, lab = array("i"), array("i"), array("B")
+    int2key = [core.cube2key(initcube)]
+    key2int = {int2key[0]: 0}
+    for v, key in core._bfs_order(int2key):
+        for fi, _ in core.free_faces(key):
+            new = core.turn_key(fi, key)
+            w = key2int.get(new)
+            if w is None:
+                w = key2int[new] = len(int2key)
+                int2key.append(new)
+            src.append(v)
+            dst.append(w)
+            lab.append(fi)
+    del key2int
+    return _build(np.array(int2key, dtype=np.uint64),
+                  np.frombuffer(src, np.int32), np.frombuffer(dst, np.int32),
+                  np.frombuffer(lab, np.uint8))
+
+
+def _build(keys, src, dst, lab):
+    """ Assemble a CSRGraph from clockwise arcs src -> dst labeled lab,
+    adding the reverse arcs. """
+    allsrc = np.concatenate([src, dst])
+    order = np.argsort(allsrc, kind="stable")
+    indices = np.concatenate([dst, src])[order]
+    labels = np.concatenate([lab, lab + INVERSE])[order]
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(allsrc, minlength=len(keys)), out=indptr[1:])
+    return CSRGraph(keys, indptr, indices.astype(np.int32),
+                    labels.astype(np.uint8))
+
+
+def from_explore(verts, edges, edgelabels, int2cube):
+    """ Build a CSRGraph from explore return values. """
+    keys = np.array([core.cube2key(int2cube[v]) for v in verts],
+                    dtype=np.uint64)
+    src, dst, lab = [], [], []
+    for e, names in edgelabels.items():
+        for name in names:
+            src.append(e[0])
+            dst.append(e[1])
+            lab.append(core.FACENAMES.index(name))
+    return _build(keys, np.array(src, dtype=np.int32),
+                  np.array(dst, dtype=np.int32), np.array(lab, dtype=np.uint8))
+
+
+def clockwise(csr):
+    """ Arrays src, dst, labels of the clockwise arcs of a CSRGraph, i.e. the
+    edges explore outputs. """
+    src = np.repeat(np.arange(len(csr.keys), dtype=np.int32),
+                    np.diff(csr.indptr))
+    cw = csr.labels < INVERSE
+    return src[cw], csr.indices[cw], csr.labels[cw]
+
+
+def to_explore(csr):
+    """ Convert a CSRGraph into verts, edges, edgelabels, int2cube and
+    cube2int as returned by explore. """
+    src, dst, lab = clockwise(csr)
+    edges, edgelabels = [], {}
+    # explore lists edges ordered by source vertex, then by face
+    for v, l, w in sorted(zip(src.tolist(), lab.tolist(), dst.tolist())):
+        edges.append((v, w))
+        edgelabels[(v, w)] = edgelabels.get((v, w), "") + core.FACENAMES[l]
+    int2cube = {v: core.key2cube(key)
+                for v, key in enumerate(csr.keys.tolist())}
+    cube2int = {tuple(cube): v for v, cube in int2cube.items()}
+    return list(range(len(csr.keys))), edges, edgelabels, int2cube, cube2int
+
+
+def to_networkx(csr):
+    """ Graph of a CSRGraph for use with shortest_path and layers_distance,
+    equal to nx.Graph(edges) for edges returned by explore. """
+    src, dst, _ = clockwise(csr)
+    g = nx.Graph()
+    g.add_nodes_from(range(len(csr.keys)))
+    g.add_edges_from(zip(src.tolist(), dst.tolist()))
+    return g
+
+
+def to_edgelabels(csr):
+    """ Edge labels dictionary of a CSRGraph as returned by explore. """
+    return to_explore(csr)[2]
+
+
+def vertex(csr, cube):
+    """ Vertex number of a bandage shape in a CSRGraph, or None if absent. """
+    key = np.uint64(core.cube2key(cube))
+    found = np.flatnonzero(csr.keys == key)
+    return int(found[0]) if len(found) else None
+
+
+def adjacency(g):
+    """ Arrays indptr and indices of a symmetric CSR adjacency, and the list
+    of vertices they index, for a networkx Graph or a CSRGraph. """
+    if isinstance(g, CSRGraph):
+        return g.indptr, g.indices, range(len(g.keys))
+    nodes = list(g)
+    index = {v: i for i, v in enumerate(nodes)}
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum([len(g[v]) for v in nodes], out=indptr[1:])
+    indices = np.fromiter((index[w] for v in nodes for w in g[v]),
+                          dtype=np.int32, count=indptr[-1])
+    return indptr, indices, nodes
+
+
+def bfs(indptr, indices, sources):
+    """ Multi-source breadth-first search over a CSR adjacency. Returns an
+    array of distances from the nearest source, -1 where unreachable. """
+    dist = np.full(len(indptr) - 1, -1, dtype=np.int32)
+    frontier = np.unique(np.asarray(sources, dtype=np.int64))
+    dist[frontier] = 0
+    level = 0
+    while frontier.size:
+        level += 1
+        starts = indptr[frontier]
+        counts = indptr[frontier + 1] - starts
+        # positions of all arcs leaving the frontier, range by range
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        nbrs = indices[offsets + np.arange(offsets.size)]
+        frontier = np.unique(nbrs[dist[nbrs] < 0])
+        dist[frontier] = level
+    return dist
+
+
+def degrees(csr):
+    """ Array of vertex degrees of a CSRGraph, counted as in the networkx
+    Graph of explore edges: distinct neighbours, self loops counting two. """
+    n = len(csr.keys)
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(csr.indptr))
+    pairs = np.unique(src * n + csr.indices)
+    src, dst = pairs // n, pairs % n
+    return (np.bincount(src, minlength=n) +
+            np.bincount(src[src == dst], minlength=n))
@@ -1,11 +1,16 @@
 # -*- coding: utf-8 -*-
 """
-Provides drawing capability for bandaged cube exploration: function draw_cubes.
+Provides drawing capability for bandaged cube exploration: function draw_cubes,
+and render_pages for rendering many shapes into image files.
 """
 
-import copy
+import multiprocessing as mp
+import os
+from functools import lru_cache
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from mpl_toolkits.mplot3d.art3d import Poly3DCollection
 from operator import itemgetter
 from . import core
@@ -21,9 +26,15 @@ def _ternary(dec):
     return [0]*(3 - len(res)) + res
 
 
-def _draw_block(ax, at, size, alpha, color, lwidth):
-    """ Construct a 3d block object and append it to the passed AxesSubplot
-    object to be drawn later.
+_COORDS = [_ternary(i) for i in range(27)]
+# rotate so that "code graphic" for cube input matches drawing orientation
+_ROTATE = itemgetter(24, 15, 6, 21, 12, 3, 18, 9,  0,
+                     25, 16, 7, 22, 13, 4, 19, 10, 1,
+                     26, 17, 8, 23, 14, 5, 20, 11, 2)
+
+
+def _block_faces(at, size, opaque):
+    """ List of faces of a 3d block, each a list of four vertices.
         For opaque (alpha=1) drawing, we need to take care of not drawing
     things that are not visible ourselves, because of mpl's likely
     unsalvageably buggy drawing (z)order. """
@@ -37,6 +48,13 @@ def _draw_block(ax, at, size, alpha, color, lwidth):
                   [x0 + x, y0 + y, z0 + z],
                   [x0,     y0 + y, z0 + z]])
 
+    if not opaque:  # if transparency, draw all sides for any block
+        return [[V[0], V[1], V[2], V[3]], # down
+                [V[4], V[5], V[6], V[7]], # up
+                [V[1], V[5], V[6], V[2]], # right
+                [V[0], V[4], V[7], V[3]], # left
+                [V[0], V[1], V[5], V[4]], # front
+                [V[2], V[6], V[7], V[3]]] # back
     faces = []
     if x0 + x == 3: # always draw global right face
         faces.append([V[1], V[5], V[6], V[2]])
@@ -44,20 +62,49 @@ def _draw_block(ax, at, size, alpha, color, lwidth):
         faces.append([V[0], V[1], V[5], V[4]])
     if z0 + z == 3: # always draw global up face
         faces.append([V[4], V[5], V[6], V[7]])
-    if alpha < 1:   # if transparency, draw all sides for any block
-        faces = [[V[0], V[1], V[2], V[3]], # down
-                 [V[4], V[5], V[6], V[7]], # up
-                 [V[1], V[5], V[6], V[2]], # right
-                 [V[0], V[4], V[7], V[3]], # left
-                 [V[0], V[1], V[5], V[4]], # front
-                 [V[2], V[6], V[7], V[3]]] # back
+    return faces
+
+
+@lru_cache(maxsize=1 << 12)
+def _shape_faces(key, opaque):
+    """ F x 4 x 3 array of faces of all blocks of the shape with given key.
+    Keys identify normalized shapes, so geometry is computed once per
+    shape. """
+    # swap low and high corners for backview - maybe add an option later
+    lo, hi = {}, {}
+    for block, xyz in zip(_ROTATE(core.key2cube(key)), _COORDS):
+        lo[block] = [min(a, b) for a, b in zip(lo.get(block, xyz), xyz)]
+        hi[block] = [max(a, b) for a, b in zip(hi.get(block, xyz), xyz)]
+    faces = []
+    for block in lo:
+        faces += _block_faces(lo[block], [1 + h - l for h, l in
+                                          zip(hi[block], lo[block])], opaque)
+    return np.array(faces, dtype=float)
+
 
+def _draw_cube(ax, cube, alpha, color, lwidth):
+    """ Append all blocks of a cubelist to the passed AxesSubplot object as
+    a single 3d collection. """
+    ax.set_axis_off()
+    ax.axis("scaled")
+    ax.set_xlim3d(0, 3)
+    ax.set_ylim3d(0, 3)
+    ax.set_zlim3d(0, 3)
+    faces = _shape_faces(core.cube2key(cube), alpha >= 1)
     collection = Poly3DCollection(faces, linewidths=lwidth, edgecolors="black")
     collection.set_facecolor((*color, alpha))
-    # collection.set_edgecolor((1, 1, 1, 0.1))
     ax.add_collection3d(collection)
 
 
+def _fill(fig, cubes, alpha, color, linewidth, ncol):
+    """ Draw cubelists into a grid of subplots of fig. """
+    for i, cube in enumerate(cubes):
+        ax = fig.add_subplot(len(cubes) // ncol + 1, ncol, 1 + i,
+                             projection="3d")
+        _draw_cube(ax, cube, alpha, color, linewidth)
+    fig.subplots_adjust(wspace=0, hspace=0)
+
+
 def draw_cubes(cubes, alpha=1, color=(1, 1, 1), size=4, linewidth=2, ncol=3):
     """ Draw one or several bandage shapes in a grid layout.
     Parameters:
@@ -75,36 +122,36 @@ def draw_cubes(cubes, alpha=1, color=(1, 1, 1), size=4, linewidth=2, ncol=3):
 
     cnt = len(cubes_)
     fig = plt.figure(figsize=((ncol * size, (cnt // ncol + 1)*size)))
-    for i, cube in enumerate(cubes_):
-        cube = core.normalize(copy.deepcopy(cube))
-        # rotate so that "code graphic" for cube input matches drawing orientation
-        rcube = list(itemgetter(24, 15, 6, 21, 12, 3, 18, 9,  0,
-                                25, 16, 7, 22, 13, 4, 19, 10, 1,
-                                26, 17, 8, 23, 14, 5, 20, 11, 2)(cube))
-        rev = rcube[::-1]
-        blocks = set(cube)
-   
-        ax = fig.add_subplot(cnt // ncol + 1, ncol, 1 + i, projection="3d")
-        ax.set_axis_off()
-        ax.axis("scaled")
-        ax.set_xlim3d(0, 3)
-        ax.set_ylim3d(0, 3)
-        ax.set_zlim3d(0, 3)
-        for block in blocks:
-            # swap "rev" and "rcube" for backview - maybe add an option later
-            x0, y0, z0 = _ternary(rcube.index(block))
-            x1, y1, z1 = _ternary(len(rcube) - 1 - rev.index(block))
-            x, y, z = min(x0, x1), min(y0, y1), min(z0, z1)
-#            if rcube.index(block) == 14 or rev.index(block) == 26-14:
-#                color=(1,1,0)
-#            elif rcube.index(block) == 22 or rev.index(block) == 26-22:
-#                color=(1,0.647,0)
-#            elif rcube.index(block) == 10 or rev.index(block) == 26-10:
-#                color=(0,1,0)
-#            else:
-#                color=(1,1,1)
-            _draw_block(ax, (x, y, z), (1 + abs(x1 - x0), 1 + abs(y1 - y0),
-                1 + abs(z1 - z0)), alpha, color, linewidth)
-
-    plt.subplots_adjust(wspace=0, hspace=0)
+    _fill(fig, cubes_, alpha, color, linewidth, ncol)
     plt.show()
+
+
+def _render(job):
+    """ Render one page of cubelists into an image file, without pyplot so
+    that no display is needed. """
+    path, cubes, alpha, color, size, linewidth, ncol, dpi = job
+    fig = Figure(figsize=(ncol * size, (len(cubes) // ncol + 1)*size))
+    FigureCanvasAgg(fig)
+    _fill(fig, cubes, alpha, color, linewidth, ncol)
+    fig.savefig(path, dpi=dpi)
+    return path
+
+
+def render_pages(cubes, directory, perpage=100, alpha=1, color=(1, 1, 1),
+                 size=1, linewidth=0.5, ncol=10, dpi=100, fmt="png",
+                 processes=None):
+    """ Render a list of cubelists as thumbnails into image files
+    page_0000.png, page_0001.png, ... in directory, perpage shapes per page,
+    in a pool of worker processes unless processes=1 or there is only one
+    page. Other parameters are as for draw_cubes plus the image resolution
+    dpi and file format fmt. Returns the list of file paths. With a pool, on
+    some platforms this needs calling under if __name__ == "__main__". """
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(os.path.join(directory, "page_%04d.%s" % (n, fmt)),
+             [list(cube) for cube in cubes[i:i + perpage]],
+             alpha, color, size, linewidth, ncol, dpi)
+            for n, i in enumerate(range(0, len(cubes), perpage))]
+    if processes == 1 or len(jobs) < 2:
+        return [_render(job) for job in jobs]
+    with mp.Pool(processes) as pool:
+        return pool.map(_render, jobs)
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+The isotropy group of a bandage shape S, i.e. the group of turn sequences
+from S back to S, acting on the blocks of S - what explore(fullperm=True)
+tracks. Elements are permutations of block indices: p[b] is the index of the
+block found at the position of block b of S after the turn sequence.
+
+Loops at S generating the group are read off a spanning tree of the shape
+graph, one per edge, and fed into the Schreier-Sims algorithm, which gives
+the group order and membership testing without enumerating any states with
+tracked blocks. mine_loops and generators find short such loops in move
+notation, e.g. for step 2 of the solution approach in the README.
+"""
+
+import multiprocessing as mp
+from collections import namedtuple
+from . import core
+from .graph import INVERSE, MOVENAMES
+from .solve import _invname
+
+
+# cube: normalized initial cubelist, keys, index, perms: as by transports,
+# group: isotropy group, gens: loops generating it as by isotropy_group
+Engine = namedtuple("Engine", ["cube", "keys", "index", "perms", "group",
+                               "gens"])
+# base: base points, gens[i]: generators of the stabilizer of base[:i],
+# trans[i]: dictionary orbit point -> permutation taking base[i] to it
+PermGroup = namedtuple("PermGroup", ["degree", "base", "gens", "trans"])
+
+
+def compose(a, b):
+    """ Permutation a after b. """
+    return tuple(a[i] for i in b)
+
+
+def inverse(a):
+    """ Inverse permutation. """
+    res = [0]*len(a)
+    for i, ai in enumerate(a):
+        res[ai] = i
+    return tuple(res)
+
+
+def _sift(group, g, start=0):
+    """ Divide g by coset representatives of levels start... of the
+    stabilizer chain. Returns the residue and the level it got stuck at. """
+    for i in range(start, len(group.base)):
+        pt = g[group.base[i]]
+        if pt not in group.trans[i]:
+            return g, i
+        g = compose(inverse(group.trans[i][pt]), g)
+    return g, len(group.base)
+
+
+def _add(group, g, start, done):
+    """ Make the stabilizer chain from level start on contain g, adding
+    Schreier generators of extended orbits recursively. """
+    h, j = _sift(group, g, start)
+    if h == tuple(range(group.degree)):
+        return False
+    if j == len(group.base):
+        pt = next(i for i, hi in enumerate(h) if hi != i)
+        group.base.append(pt)
+        group.gens.append([])
+        group.trans.append({pt: tuple(range(group.degree))})
+        done.append(set())
+    for k in range(j, start - 1, -1):
+        gens, trans = group.gens[k], group.trans[k]
+        gens.append(h)
+        queue = list(trans)
+        for x in queue: # extend orbit, keeping existing representatives
+            for s in gens:
+                if s[x] not in trans:
+                    trans[s[x]] = compose(s, trans[x])
+                    queue.append(s[x])
+        for x in list(trans):
+            for si, s in enumerate(gens):
+                if (x, si) in done[k]:
+                    continue
+                done[k].add((x, si))
+                schreier = compose(inverse(trans[s[x]]), compose(s, trans[x]))
+                _add(group, schreier, k + 1, done)
+    return True
+
+
+def schreier_sims(gens, degree):
+    """ Stabilizer chain of the permutation group of given degree generated
+    by gens. Returns the PermGroup and the list of gens that were not
+    already in the group generated by the previous ones. """
+    group = PermGroup(degree, [], [], [])
+    done, needed = [], []
+    for g in gens:
+        if _add(group, tuple(g), 0, done):
+            needed.append(g)
+    return group, needed
+
+
+def order(group):
+    """ Order of a PermGroup. """
+    res = 1
+    for trans in group.trans:
+        res *= len(trans)
+    return res
+
+
+def contains(group, g):
+    """ Is permutation g in a PermGroup? """
+    h, _ = _sift(group, tuple(g))
+    return h == tuple(range(group.degree))
+
+
+def transports(initcube, both=False):
+    """ Breadth-first spanning tree of the shape graph of initcube, numbered
+    as by explore, or over quarter turns in both directions if both=True,
+    giving shortest tree paths. Returns the list of keys, a list of (parent
+    vertex, move label) pairs, see graph.MOVENAMES (None for the root), a
+    list of cubie permutations, see core._compose, taking initcube to each
+    vertex along the tree and a dictionary key -> vertex number. """
+    keys = [core.cube2key(initcube)]
+    index, parents, perms = {keys[0]: 0}, [None], [list(range(27))]
+    for v, key in enumerate(keys):
+        for fi, _ in core.free_faces(key):
+            moves = [(fi, core.turn_key(fi, key), core._CELLPERMS[fi])]
+            if both:
+                moves.append((fi + INVERSE, core.unturn_key(fi, key),
+                              inverse(core._CELLPERMS[fi])))
+            for label, new, cellperm in moves:
+                if new not in index:
+                    index[new] = len(keys)
+                    keys.append(new)
+                    parents.append((v, label))
+                    perms.append(core._compose(perms[v], cellperm))
+    return keys, parents, perms, index
+
+
+def loops(initcube):
+    """ Generator of loops at initcube, one per edge (v, face index fi, w) of
+    its shape graph not in the spanning tree of transports: go along the
+    tree to v, turn fi, and go back along the tree from w. Together they
+    generate the isotropy group. Yields tuples (v, fi, w, block
+    permutation). """
+    cube = core.normalize(initcube)
+    first = [cube.index(b) for b in range(1, max(cube) + 1)]
+    keys, parents, perms, index = transports(cube)
+    for v, key in enumerate(keys):
+        for fi, _ in core.free_faces(key):
+            w = index[core.turn_key(fi, key)]
+            if parents[w] == (v, fi):
+                continue
+            cells = core._compose(perms[v], core._CELLPERMS[fi],
+                                  inverse(perms[w]))
+            yield v, fi, w, tuple(cube[cells[c]] - 1 for c in first)
+
+
+def isotropy_group(initcube):
+    """ Isotropy group of bandage shape initcube acting on its blocks, as a
+    PermGroup, and a list of loops (v, fi, w, block permutation) as yielded
+    by loops which generate it. The number of states explore(initcube,
+    fullperm=True) would find is the number of shapes times the group
+    order. """
+    nblocks = max(core.normalize(initcube))
+    found = list(loops(initcube))
+    group, needed = schreier_sims([p for _, _, _, p in found], nblocks)
+    needed = set(needed)
+    gens = []
+    for loop in found:
+        if loop[3] in needed:
+            gens.append(loop)
+            needed.discard(loop[3])
+    return group, gens
+
+
+def engine(initcube):
+    """ Engine for the states explore(initcube, fullperm=True) would find,
+    each given by a shape and an element of the isotropy group, so that
+    none of them has to be stored. Block numbers are those of
+    core.normalize(initcube). """
+    cube = core.normalize(initcube)
+    keys, _, perms, index = transports(cube)
+    group, gens = isotropy_group(cube)
+    return Engine(cube, keys, index, perms, group, gens)
+
+
+def count(eng):
+    """ Number of states with tracked blocks reachable from the initial
+    cubelist of an Engine. """
+    return len(eng.keys)*order(eng.group)
+
+
+def locate(eng, cube):
+    """ Split a cubelist with blocks numbered as in the initial cubelist of
+    an Engine into its shape vertex v and the block permutation left after
+    turning it back to the initial shape along the spanning tree. Returns
+    (v, permutation), or None if the shape is not reachable. """
+    v = eng.index.get(core.cube2key(cube))
+    if v is None:
+        return None
+    back = inverse(eng.perms[v])
+    first = [eng.cube.index(b) for b in range(1, max(eng.cube) + 1)]
+    return v, tuple(cube[back[c]] - 1 for c in first)
+
+
+def reachable(eng, cube):
+    """ Can cubelist cube with tracked blocks be reached from the initial
+    cubelist of an Engine? """
+    found = locate(eng, cube)
+    return found is not None and contains(eng.group, found[1])
+
+
+_TREE = None # spanning tree of a miner process, see _tree
+_SERIAL = 1 << 15 # shape graphs smaller than this are mined without a pool
+
+
+def _tree(cube):
+    """ Normalized cube, first cells of its blocks and its transports over
+    quarter turns in both directions. """
+    cube = core.normalize(cube)
+    first = [cube.index(b) for b in range(1, max(cube) + 1)]
+    return (cube, first) + transports(cube, both=True)
+
+
+def _init_miner(cube):
+    """ Pool initializer building the spanning tree for _mine. """
+    global _TREE
+    _TREE = _tree(cube)
+
+
+def _path(parents, v):
+    """ Move labels along the spanning tree from the root to v. """
+    res = []
+    while parents[v] is not None:
+        v, label = parents[v]
+        res.append(label)
+    return res[::-1]
+
+
+def _reduce(moves):
+    """ Cancel quarter turns followed by their inverse and write three equal
+    quarter turns as one inverse turn. """
+    res = []
+    for move in moves:
+        while True:
+            if res and res[-1] == _invname(move):
+                res.pop()
+            elif len(res) > 1 and res[-1] == res[-2] == move:
+                del res[-2:]
+                move = _invname(move)
+                continue
+            else:
+                res.append(move)
+            break
+    return res
+
+
+def _mine(job):
+    """ _mine_tree of a (start, step) job in a miner process. """
+    return _mine_tree(_TREE, *job)
+
+
+def _mine_tree(tree, start, step):
+    """ Shortest loop found for each block permutation, over non-tree edges
+    of every step-th vertex starting with start. """
+    cube, first, keys, parents, perms, index = tree
+    found = {}
+    for v in range(start, len(keys), step):
+        key = keys[v]
+        for fi, _ in core.free_faces(key):
+            w = index[core.turn_key(fi, key)]
+            if parents[w] == (v, fi) or parents[v] == (w, fi + INVERSE):
+                continue
+            cells = core._compose(perms[v], core._CELLPERMS[fi],
+                                  inverse(perms[w]))
+            perm = tuple(cube[cells[c]] - 1 for c in first)
+            moves = _reduce([MOVENAMES[l] for l in _path(parents, v)] +
+                            [MOVENAMES[fi]] +
+                            [_invname(MOVENAMES[l])
+                             for l in reversed(_path(parents, w))])
+            if perm not in found or len(moves) < len(found[perm]):
+                found[perm] = moves
+    return found
+
+
+def mine_loops(initcube, processes=None):
+    """ Loops at bandage shape initcube, one per non-tree edge of a shortest
+    path spanning tree of its shape graph, over a pool of worker processes
+    unless processes=1 or the graph is small. Only the shortest loop of each
+    effect on blocks is kept, and loops undoing an earlier one's effect or
+    with no effect are dropped. Returns a list of (quarter turns, move
+    notation, block permutation) triplets, shortest first. With a pool, on
+    some platforms this needs calling under if __name__ == "__main__". """
+    tree = _tree(initcube)
+    if processes == 1 or len(tree[2]) < _SERIAL:
+        parts = [_mine_tree(tree, 0, 1)]
+    else:
+        del tree
+        jobs = 4*(processes or mp.cpu_count())
+        with mp.Pool(processes, _init_miner, (initcube,)) as pool:
+            parts = list(pool.imap_unordered(_mine, [(i, jobs)
+                                                     for i in range(jobs)]))
+    found = {}
+    for part in parts:
+        for perm, moves in part.items():
+            if perm not in found or len(moves) < len(found[perm]):
+                found[perm] = moves
+    loops = sorted((len(moves), core.join_moves(moves), perm)
+                   for perm, moves in found.items())
+    res, seen = [], set()
+    for length, moves, perm in loops:
+        if perm == tuple(range(len(perm))) or inverse(perm) in seen:
+            continue
+        seen.add(perm)
+        res.append((length, moves, perm))
+    return res
+
+
+def generators(initcube, processes=None):
+    """ Short loops generating the isotropy group of bandage shape
+    initcube, see mine_loops: shortest loops are taken while they enlarge
+    the group, then loops the others generate are dropped, longest first.
+    Returns the PermGroup and a list of (move notation, block permutation)
+    pairs. processes is as for mine_loops, including the need for a
+    __main__ guard. """
+    loops = mine_loops(initcube, processes)
+    degree = max(core.normalize(initcube))
+    group, needed = schreier_sims([perm for _, _, perm in loops], degree)
+    gens = list(needed)
+    for perm in needed[::-1]:
+        rest = [g for g in gens if g != perm]
+        if order(schreier_sims(rest, degree)[0]) == order(group):
+            gens = rest
+    moves = {perm: notation for _, notation, perm in loops}
+    return group, [(moves[perm], perm) for perm in gens]
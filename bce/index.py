@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Index over large sets of shapes, e.g. CSRGraph keys or census keys, for
+finding a shape without Python dictionaries: exact lookup by binary search
+in the sorted key array, and approximate "which known shapes look like this
+one" queries by locality sensitive hashing.
+
+Similarity is that of core.nbrrep, which only depends on the number of
+bonds two shape keys differ in, see features. Most bonds of most shapes are
+absent, so sampling key bits would put most shapes into a few buckets.
+Instead, each hash table combines MinHashes of the sets of present bonds:
+the first present bond in a random bond order, applied to keys by lookup
+tables like turns are. Shapes differing in few bonds have similar bond sets
+and likely share a bucket in some table. Buckets are stored as sorted bucket
+code arrays per table. Saved indexes are memory-mapped on load.
+"""
+
+import json
+import os
+from collections import namedtuple
+import numpy as np
+from . import core
+from .export import _staged
+from .features import as_keys, similarities
+from .graph import _lookup
+
+
+VERSION = 1
+_META = "meta.json"
+
+# keys: sorted uint64 shape keys
+# vertices: vertex number (position in the indexed key array) of each key
+# orders: (tables * rows) x 6 x 512 uint64 key lookup tables of random bond
+#         orders, rows consecutive ones per hash table
+# codes: tables x N uint32 array of sorted bucket codes of each table
+# slots: tables x N uint32 positions in keys of the shapes behind codes
+ShapeIndex = namedtuple("ShapeIndex", ["keys", "vertices", "orders", "codes",
+                                       "slots"])
+
+
+def _codes(keys, orders, tables):
+    """ tables x N array of bucket codes of keys: MinHashes for consecutive
+    groups of bond orders, 6 bits each. """
+    res = np.zeros((tables, len(keys)), dtype=np.uint32)
+    rows = len(orders) // tables
+    for h, t in enumerate(orders):
+        permuted = _lookup(t, keys)
+        lowest = permuted & (~permuted + np.uint64(1))
+        # the position of the lowest set bit, len(BONDS) if there is none
+        first = np.where(permuted == 0, len(core.BONDS),
+                         np.log2(np.maximum(lowest, 1).astype(np.float64)))
+        res[h // rows] |= first.astype(np.uint32) << np.uint32(6*(h % rows))
+    return res
+
+
+def build(shapes, tables=8, rows=5, seed=0):
+    """ ShapeIndex of shapes, a list of cubelists or a key array such as
+    CSRGraph.keys, with tables hash tables of rows MinHashes each. More rows
+    give smaller buckets, more tables find more similar shapes. """
+    if rows > 5:
+        raise Exception("At most 5 MinHashes fit into a bucket code!")
+    keys = as_keys(shapes)
+    vertices = np.argsort(keys, kind="stable")
+    keys = keys[vertices]
+    rng = np.random.default_rng(seed)
+    orders = np.array([core._bondtable(list(rng.permutation(len(core.BONDS))))
+                       for _ in range(tables*rows)], dtype=np.uint64)
+    codes = _codes(keys, orders, tables)
+    slots = np.argsort(codes, axis=1, kind="stable").astype(np.uint32)
+    return ShapeIndex(keys, vertices, orders,
+                      np.take_along_axis(codes, slots, axis=1), slots)
+
+
+def save(index, directory):
+    """ Store a ShapeIndex as .npy files in directory, replacing it. """
+    with _staged(directory) as tmp:
+        for field, arr in zip(ShapeIndex._fields, index):
+            np.save(os.path.join(tmp, field + ".npy"), arr)
+        with open(os.path.join(tmp, _META), "w") as f:
+            json.dump({"version": VERSION, "shapes": len(index.keys)}, f)
+
+
+def load(directory):
+    """ Memory-mapped ShapeIndex stored by save. """
+    with open(os.path.join(directory, _META)) as f:
+        if json.load(f).get("version") != VERSION:
+            raise Exception("Index built by an incompatible version!")
+    return ShapeIndex(*[np.load(os.path.join(directory, field + ".npy"),
+                                mmap_mode="r")
+                        for field in ShapeIndex._fields])
+
+
+def _key(shape):
+    """ Key of a shape given as a cubelist or a key. """
+    if isinstance(shape, (int, np.integer)):
+        return shape
+    return core.cube2key(shape)
+
+
+def lookup(index, shape):
+    """ Vertex number of a shape, a cubelist or a key, or None if it is not
+    indexed. """
+    key = np.uint64(_key(shape))
+    i = int(np.searchsorted(index.keys, key))
+    if i < len(index.keys) and index.keys[i] == key:
+        return int(index.vertices[i])
+    return None
+
+
+def lookup_keys(index, keys):
+    """ Vectorised lookup for a uint64 key array, -1 where not indexed. """
+    keys = np.asarray(keys, dtype=np.uint64)
+    i = np.minimum(np.searchsorted(index.keys, keys), len(index.keys) - 1)
+    found = index.keys[i] == keys if len(index.keys) else i < 0
+    return np.where(found, index.vertices[i] if len(index.keys) else -1, -1)
+
+
+def similar(index, shape, k=10):
+    """ Approximately the k indexed shapes most similar to shape (a cubelist
+    or key) by core.similarity of nbrreps: the best among shapes sharing a
+    bucket with it. Returns arrays of vertex numbers and similarities, most
+    similar first. """
+    key = _key(shape)
+    qcodes = _codes(np.array([key], dtype=np.uint64), index.orders,
+                    len(index.codes))[:, 0]
+    found = []
+    for t, code in enumerate(qcodes):
+        lo = np.searchsorted(index.codes[t], code, side="left")
+        hi = np.searchsorted(index.codes[t], code, side="right")
+        found.append(index.slots[t][lo:hi])
+    slots = np.unique(np.concatenate(found))
+    sims = similarities(key, index.keys[slots])
+    top = np.argsort(-sims, kind="stable")[:k]
+    return index.vertices[slots[top]], sims[top]
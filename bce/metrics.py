@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Fast exact eccentricity based metrics of puzzle graphs: diameter, radius,
+center and periphery by eccentricity bounding, and all eccentricities by
+bit-parallel breadth-first search. Graphs may be networkx Graphs or
+graph.CSRGraphs and are assumed connected, as explored graphs are.
+"""
+
+import numpy as np
+from .graph import adjacency, bfs
+
+
+def eccentricity_array(indptr, indices):
+    """ Eccentricities of all vertices of a CSR adjacency. Runs breadth-first
+    searches from 64 sources at once, vertex w carrying a bitmask of the
+    sources that have reached it. """
+    n = len(indptr) - 1
+    ecc = np.zeros(n, dtype=np.int32)
+    isolated = indptr[1:] == indptr[:-1]
+    starts = indptr[:-1]
+    for first in range(0, n, 64):
+        sources = np.arange(first, min(first + 64, n))
+        bits = np.uint64(1) << np.arange(len(sources), dtype=np.uint64)
+        seen = np.zeros(n, dtype=np.uint64)
+        seen[sources] = bits
+        frontier = seen.copy()
+        level = 0
+        while len(indices):
+            level += 1
+            # trailing zero keeps reduceat ranges valid for the last vertices
+            reached = np.bitwise_or.reduceat(
+                np.append(frontier[indices], np.uint64(0)), starts)
+            reached[isolated] = 0
+            frontier = reached & ~seen
+            new = np.bitwise_or.reduce(frontier)
+            if not new:
+                break
+            seen |= frontier
+            ecc[sources[(new & bits) != 0]] = level
+    return ecc
+
+
+def eccentricity(g):
+    """ Dictionary of eccentricities of all vertices of graph g, like
+    nx.eccentricity(g) but bit-parallel. """
+    indptr, indices, nodes = adjacency(g)
+    return dict(zip(nodes, eccentricity_array(indptr, indices).tolist()))
+
+
+def extremes(g):
+    """ Exact diameter, radius, center and periphery of graph g, the latter
+    two as lists of vertices, computed by the BoundingDiameters algorithm of
+    Takes and Kosters. Every breadth-first search from a vertex v gives
+    eccentricity bounds for all vertices w:
+        max(d(v, w), ecc(v) - d(v, w)) <= ecc(w) <= ecc(v) + d(v, w),
+    and searches continue only while some vertex could still be central or
+    peripheral. Typically needs a handful of searches instead of one per
+    vertex. """
+    indptr, indices, nodes = adjacency(g)
+    n = len(nodes)
+    lower = np.zeros(n, dtype=np.int64)
+    upper = np.full(n, n, dtype=np.int64)
+    degree = np.diff(indptr)
+    candidates = np.ones(n, dtype=bool)
+    pick_high = True
+    while candidates.any():
+        cands = np.flatnonzero(candidates)
+        # alternate between likely peripheral and likely central vertices,
+        # preferring high degree on ties
+        if pick_high:
+            order = np.lexsort((-degree[cands], -upper[cands]))
+        else:
+            order = np.lexsort((-degree[cands], lower[cands]))
+        v = cands[order[0]]
+        pick_high = not pick_high
+
+        d = bfs(indptr, indices, [v]).astype(np.int64)
+        ecc = d.max()
+        lower = np.maximum(lower, np.maximum(d, ecc - d))
+        upper = np.minimum(upper, ecc + d)
+        lower[v] = upper[v] = ecc
+
+        dlow, rup = lower.max(), upper.min()
+        candidates &= (lower != upper) & ((upper >= dlow) | (lower <= rup))
+
+    diameter, radius = int(lower.max()), int(upper.min())
+    known = lower == upper
+    center = [nodes[i] for i in np.flatnonzero(known & (lower == radius))]
+    periphery = [nodes[i] for i in np.flatnonzero(known & (lower == diameter))]
+    return diameter, radius, center, periphery
+
+
+def diameter(g):
+    """ Exact diameter of graph g, see extremes. """
+    return extremes(g)[0]
+
+
+def radius(g):
+    """ Exact radius of graph g, see extremes. """
+    return extremes(g)[1]
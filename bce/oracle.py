@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed solve tables: one breadth-first search backwards from the solved
+shape stores for every shape of a graph.CSRGraph an optimal next quarter
+turn, after which optimal solutions are read off in O(solution length).
+Shapes given as cubelists are found by a linear scan of the graph's keys,
+or quickly with an index.ShapeIndex of them, built once by
+index.build(csr.keys).
+"""
+
+import numpy as np
+from . import core
+from .graph import MOVENAMES, bfs, vertex
+from .index import lookup
+
+
+NOMOVE = 255 # table entry of the solved shape and unreachable shapes
+
+
+def build(csr, solved=0):
+    """ uint8 array indexed by vertex number of a CSRGraph holding the arc
+    label (see graph.MOVENAMES) of a quarter turn towards vertex solved along
+    a shortest path. """
+    dist = bfs(csr.indptr, csr.indices, [solved])
+    src = np.repeat(np.arange(len(csr.keys), dtype=np.int64),
+                    np.diff(csr.indptr))
+    closer = (dist[csr.indices] == dist[src] - 1) & (dist[src] > 0)
+    # first arc towards solved of each vertex, arcs are ordered by source
+    first, arcs = np.unique(src[closer], return_index=True)
+    table = np.full(len(csr.keys), NOMOVE, dtype=np.uint8)
+    table[first] = csr.labels[np.flatnonzero(closer)[arcs]]
+    return table
+
+
+def _step(csr, table, v):
+    """ Vertex reached from v by its table move. """
+    lo, hi = csr.indptr[v], csr.indptr[v + 1]
+    arc = lo + int(np.flatnonzero(csr.labels[lo:hi] == table[v])[0])
+    return int(csr.indices[arc])
+
+
+def _vertex(csr, mixed, index):
+    """ Vertex number of mixed, a cubelist or a vertex number, looked up in
+    ShapeIndex index of csr.keys if given. """
+    if type(mixed) == int:
+        return mixed
+    v = vertex(csr, mixed) if index is None else lookup(index, mixed)
+    if v is None:
+        raise Exception("Shape is not in the graph!")
+    return v
+
+
+def next_move(csr, table, mixed, index=None):
+    """ Optimal next quarter turn for mixed, a cubelist or a vertex number,
+    or None if it is solved. index is an optional ShapeIndex of csr.keys,
+    see module docstring. Raises an exception for shapes not in the graph,
+    like solution. """
+    v = _vertex(csr, mixed, index)
+    return None if table[v] == NOMOVE else MOVENAMES[table[v]]
+
+
+def solution(csr, table, mixed, index=None):
+    """ Shortest path from mixed, a cubelist or a vertex number, to the
+    solved shape of the table in standard move notation, like
+    core.shortest_path outputs. index is as for next_move. """
+    v = _vertex(csr, mixed, index)
+    moves = []
+    while table[v] != NOMOVE:
+        moves.append(MOVENAMES[table[v]])
+        v = _step(csr, table, v)
+    return core.join_moves(moves)
+
+
+def save(table, path):
+    """ Store a solve table as a .npy file. """
+    np.save(path, table)
+
+
+def load(path):
+    """ Memory-map a solve table stored by save. """
+    return np.load(path, mmap_mode="r")
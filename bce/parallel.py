@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+Parallel breadth-first exploration of puzzle graphs over several processes:
+function explore_parallel.
+
+Work is done on NumPy arrays of keys, see graph.turn_keys: workers expand
+chunks of each layer into arcs, and deduplicate the new keys they own in a
+hash-partitioned visited set of sorted key arrays. The master only numbers
+the shapes new in each layer and collects the arc arrays.
+"""
+
+import multiprocessing as mp
+import os
+import numpy as np
+from . import core
+from .graph import blocked_keys, turn_keys
+
+
+_EMPTY = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))
+
+
+def _owners(keys, nprocs):
+    """ Process owning each key's slice of the visited set. """
+    mixed = keys * np.uint64(0x9E3779B97F4A7C15) >> np.uint64(40)
+    return (mixed % np.uint64(nprocs)).astype(np.int64)
+
+
+def _expand(keys, lo):
+    """ Arcs from shapes keys, numbered from lo, in the order explore_keys
+    follows them: arrays of source vertices, face indices and new keys. """
+    blocked = blocked_keys(keys)
+    src, fis, new = [], [], []
+    for fi in core.OUTER_FACES:
+        free = np.flatnonzero((blocked >> np.uint64(fi) & np.uint64(1)) == 0)
+        src.append(free + lo)
+        fis.append(np.full(len(free), fi, dtype=np.uint8))
+        new.append(turn_keys(fi, keys[free]))
+    src = np.concatenate(src)
+    # arcs are grouped by face, a stable sort orders them by source first
+    order = np.argsort(src, kind="stable")
+    return src[order], np.concatenate(fis)[order], np.concatenate(new)[order]
+
+
+def _probe(visited, keys, positions):
+    """ Look up keys found at ascending arc positions in a slice of the
+    visited set. Returns the index of each key among its distinct values,
+    their vertex numbers, -1 for unvisited ones, and the arc positions of
+    their first occurrences. """
+    known, verts = visited
+    uniq, first, inv = np.unique(keys, return_index=True,
+                                 return_inverse=True)
+    res = np.full(len(uniq), -1, dtype=np.int64)
+    if len(known):
+        i = np.minimum(np.searchsorted(known, uniq), len(known) - 1)
+        found = known[i] == uniq
+        res[found] = verts[i[found]]
+    return inv, res, positions[first]
+
+
+def _insert(visited, keys, verts):
+    """ Slice of the visited set with keys numbered verts added. """
+    known, knownverts = visited
+    order = np.argsort(keys)
+    at = np.searchsorted(known, keys[order])
+    return (np.insert(known, at, keys[order]),
+            np.insert(knownverts, at, verts[order]))
+
+
+def _handle(visited, cmd, payload):
+    """ Serve a request of the master on a slice of the visited set:
+        ("expand", (keys, lo)):         arcs from keys, see _expand
+        ("probe", (keys, positions)):   see _probe
+        ("insert", (keys, verts)):      add keys to the visited set
+    Returns the possibly changed slice and the reply. """
+    if cmd == "expand":
+        return visited, _expand(*payload)
+    if cmd == "probe":
+        return visited, _probe(visited, *payload)
+    return _insert(visited, *payload), None
+
+
+def _worker(conn):
+    """ Worker process loop serving requests by _handle on its slice of the
+    visited set until ("stop", None). """
+    visited = _EMPTY
+    while True:
+        cmd, payload = conn.recv()
+        if cmd == "stop":
+            conn.close()
+            return
+        visited, reply = _handle(visited, cmd, payload)
+        conn.send(reply)
+
+
+def _scatter(conns, cmd, payloads):
+    """ Send a request to all workers and gather their replies in order. A
+    one-element list in place of a connection holds a slice of the visited
+    set served in-process. """
+    local = {}
+    for p, (conn, payload) in enumerate(zip(conns, payloads)):
+        if isinstance(conn, list):
+            conn[0], local[p] = _handle(conn[0], cmd, payload)
+        else:
+            conn.send((cmd, payload))
+    return [local[p] if p in local else conn.recv()
+            for p, conn in enumerate(conns)]
+
+
+def _edges(src, dst, fis, n):
+    """ edges and edgelabels as explore_keys returns them, from arc arrays
+    of a graph of n vertices. """
+    edges = list(zip(src.tolist(), dst.tolist()))
+    names = np.array(list(core.FACENAMES))[fis].tolist()
+    edgelabels = dict(zip(edges, names))
+    # several faces turning a shape into the same one share an edge label
+    _, inv, counts = np.unique(src * n + dst, return_inverse=True,
+                               return_counts=True)
+    multi = np.flatnonzero(counts[inv] > 1).tolist()
+    for i in multi:
+        edgelabels[edges[i]] = ""
+    for i in multi:
+        edgelabels[edges[i]] += names[i]
+    return edges, edgelabels
+
+
+def explore_keys_parallel(initkey, processes=None):
+    """ Level-synchronous parallel version of core.explore_keys with the same
+    results. Each BFS layer is split into chunks expanded by worker
+    processes, new shapes are deduplicated by the processes owning them in
+    a hash-partitioned visited set, see module docstring. With one process,
+    by default on a single CPU, the same runs in-process. """
+    nprocs = processes if processes else os.cpu_count()
+    conns, procs = [], []
+    if nprocs == 1:
+        conns.append([_EMPTY])
+    for _ in range(nprocs if nprocs > 1 else 0):
+        here, there = mp.Pipe()
+        proc = mp.Process(target=_worker, args=(there,), daemon=True)
+        proc.start()
+        conns.append(here)
+        procs.append(proc)
+
+    try:
+        int2key = [np.array([initkey], dtype=np.uint64)]
+        owner = int(_owners(int2key[0], nprocs)[0])
+        _scatter(conns, "insert", [(int2key[0], np.zeros(1, dtype=np.int64))
+                                   if p == owner else _EMPTY
+                                   for p in range(nprocs)])
+        arcs = []
+        lo, hi = 0, 1
+        while lo < hi:
+            frontier = int2key[-1]
+            size = -(-len(frontier) // nprocs)
+            src, fis, new = [np.concatenate(a) for a in zip(*_scatter(
+                conns, "expand", [(frontier[p*size:(p + 1)*size], lo + p*size)
+                                  for p in range(nprocs)]))]
+
+            # each owner deduplicates its keys and looks them up
+            owners = _owners(new, nprocs)
+            parts = [np.flatnonzero(owners == p) for p in range(nprocs)]
+            probed = _scatter(conns, "probe", [(new[part], part)
+                                               for part in parts])
+
+            # number unvisited shapes in order of discovery, like explore_keys
+            firsts = np.concatenate([first[verts < 0]
+                                     for _, verts, first in probed])
+            numbers = np.empty(len(firsts), dtype=np.int64)
+            numbers[np.argsort(firsts)] = np.arange(hi, hi + len(firsts))
+            dst = np.empty(len(new), dtype=np.int64)
+            inserts, done = [], 0
+            for part, (inv, verts, first) in zip(parts, probed):
+                unvisited = verts < 0
+                verts[unvisited] = numbers[done:done + unvisited.sum()]
+                done += unvisited.sum()
+                dst[part] = verts[inv]
+                inserts.append((new[first[unvisited]], verts[unvisited]))
+            _scatter(conns, "insert", inserts)
+
+            arcs.append((src, dst, fis))
+            int2key.append(new[np.sort(firsts)])
+            lo, hi = hi, hi + len(firsts)
+        for conn in conns:
+            if not isinstance(conn, list):
+                conn.send(("stop", None))
+    finally:
+        for proc in procs:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+
+    edges, edgelabels = _edges(*[np.concatenate(a) for a in zip(*arcs)], hi)
+    return (list(range(hi)), edges, edgelabels,
+            np.concatenate(int2key).tolist())
+
+
+def explore_parallel(initcube, processes=None):
+    """ Breadth-first explore puzzle from given bandage state using several
+    processes, by default one per CPU. Returns the same as core.explore. On
+    some platforms this needs calling under if __name__ == "__main__". """
+    verts, edges, edgelabels, int2key = explore_keys_parallel(
+        core.cube2key(initcube), processes)
+    int2cube = {v: core.key2cube(key) for v, key in enumerate(int2key)}
+    cube2int = {tuple(cube): v for v, cube in int2cube.items()}
+    return verts, edges, edgelabels, int2cube, cube2int
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Pattern databases: admissible heuristics for solve.astar_path.
+
+A pattern database abstracts a puzzle by dissolving all its blocks except
+those of chosen dimensions, e.g. keeping only the 2x2x2 block. Face turns
+move blocks rigidly, so abstracting commutes with turning, and the
+abstracted puzzle has fewer blocks in the way of turns. Its distances are
+thus lower bounds of the distances in the full puzzle. The abstracted
+puzzle is explored once, and its distances to the abstracted goal shape are
+stored next to its sorted shape keys, packed as 4 bits per shape.
+"""
+
+from collections import namedtuple
+from functools import lru_cache
+import numpy as np
+from . import core
+
+
+# keep: sorted tuple of kept block dimensions, e.g. ((1, 1, 2), (2, 2, 2))
+# keys: sorted uint64 keys of abstracted shapes
+# dists: their distances to the abstracted goal, two per byte, low nibble
+#        first, saturating at 15
+PatternDB = namedtuple("PatternDB", ["keep", "keys", "dists"])
+
+_COORDS = [(i // 9, i // 3 % 3, i % 3) for i in range(27)]
+
+
+def block_dims(cube):
+    """ Dictionary mapping blocks of a normalized cubelist to their sorted
+    dimensions, e.g. (1, 2, 2) for a 1x2x2 block. """
+    lo, hi = {}, {}
+    for v, coords in zip(cube, _COORDS):
+        lo[v] = [min(a, b) for a, b in zip(lo.get(v, coords), coords)]
+        hi[v] = [max(a, b) for a, b in zip(hi.get(v, coords), coords)]
+    return {v: tuple(sorted(1 + h - l for h, l in zip(hi[v], lo[v])))
+            for v in lo}
+
+
+def abstract_key(key, keep):
+    """ Key of a shape with all blocks dissolved except those with sorted
+    dimensions in keep. """
+    cube = core.key2cube(key)
+    kept = {v for v, dims in block_dims(cube).items() if dims in keep}
+    return core.cube2key([v if v in kept else 0 for v in cube])
+
+
+def build(goal, keep):
+    """ Build a PatternDB for solving to cubelist goal, keeping blocks with
+    dimensions in keep, a collection of dimension triplets in any order. """
+    keep = tuple(sorted({tuple(sorted(dims)) for dims in keep}))
+    start = core.key2cube(abstract_key(core.cube2key(goal), keep))
+    keys, dists = [], []
+    for depth, layer, _, _ in core.explore_layers(start):
+        keys += layer
+        dists += [min(depth, 15)]*len(layer)
+    keys = np.array(keys, dtype=np.uint64)
+    order = np.argsort(keys)
+    dists = np.array(dists, dtype=np.uint8)[order]
+    if len(dists) % 2:
+        dists = np.append(dists, np.uint8(0))
+    return PatternDB(keep, keys[order], dists[0::2] | dists[1::2] << 4)
+
+
+def lookup(pdb, key):
+    """ Lower bound of distance of shape given by key to the goal. """
+    akey = np.uint64(abstract_key(key, pdb.keep))
+    i = int(np.searchsorted(pdb.keys, akey))
+    if i == len(pdb.keys) or pdb.keys[i] != akey:
+        return 0 # can't happen for shapes of the same puzzle
+    return int(pdb.dists[i // 2] >> 4*(i % 2) & 15)
+
+
+def heuristic(*pdbs, cachesize=1 << 20):
+    """ Admissible heuristic for solve.astar_path taking the maximum of the
+    bounds given by several pattern databases for the same goal. Bounds are
+    cached, as iterative deepening revisits shapes many times. """
+    @lru_cache(maxsize=cachesize)
+    def h(key):
+        return max(lookup(pdb, key) for pdb in pdbs)
+    return h
+
+
+def save(pdb, path):
+    """ Store a PatternDB into a .npz file. """
+    np.savez(path, keep=np.array(pdb.keep, dtype=np.uint8).reshape(-1, 3),
+             keys=pdb.keys, dists=pdb.dists)
+
+
+def load(path):
+    """ Load a PatternDB stored by save. """
+    with np.load(path) as f:
+        keep = tuple(tuple(int(d) for d in dims) for dims in f["keep"])
+        return PatternDB(keep, f["keys"], f["dists"])
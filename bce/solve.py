@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+Solvers finding shortest turn sequences between two bandage shapes without
+exploring the whole puzzle graph first.
+"""
+
+from . import core
+
+
+def _moves(key):
+    """ List (new key, move name, move) triples for all quarter turns
+    possible on a shape given by key, a move being a (face index, inverse)
+    pair. """
+    res = []
+    for fi, facename in core.free_faces(key):
+        res.append((core.turn_key(fi, key), facename, (fi, False)))
+        res.append((core.unturn_key(fi, key), facename + "'", (fi, True)))
+    return res
+
+
+def _invname(move):
+    """ Name of the quarter turn undoing a named quarter turn. """
+    return move[:-1] if move.endswith("'") else move + "'"
+
+
+def bidirectional_path(mixed, solved):
+    """ Output shortest path from mixed to solved in standard move notation,
+    where mixed and solved are bandage shapes represented by cubelists, using
+    breadth-first search from both ends. Raises exception if shapes aren't
+    connected. """
+    start, goal = core.cube2key(mixed), core.cube2key(solved)
+    if start == goal:
+        return ""
+    # key: (previous key on path, quarter turn name, depth), from either end
+    fwd, bwd = {start: (None, None, 0)}, {goal: (None, None, 0)}
+    fwdlayer, bwdlayer = [start], [goal]
+    while fwdlayer and bwdlayer:
+        forward = len(fwdlayer) <= len(bwdlayer)
+        layer, seen, other = ((fwdlayer, fwd, bwd) if forward else
+                              (bwdlayer, bwd, fwd))
+        depth = seen[layer[0]][2] + 1
+        newlayer, meets = [], []
+        for key in layer:
+            for new, name, _ in _moves(key):
+                if new in seen:
+                    continue
+                seen[new] = (key, name, depth)
+                newlayer.append(new)
+                if new in other:
+                    meets.append(new)
+        if meets:
+            meet = min(meets, key=lambda m: other[m][2])
+            return core.join_moves(_unwind(fwd, bwd, meet))
+        if forward:
+            fwdlayer = newlayer
+        else:
+            bwdlayer = newlayer
+    raise Exception("Shapes are not connected!")
+
+
+def _unwind(fwd, bwd, meet):
+    """ List quarter turns of a path through meet found by searches
+    recording predecessors in fwd and bwd. """
+    moves = []
+    key = meet
+    while fwd[key][0] is not None:
+        key, name, _ = fwd[key]
+        moves.append(name)
+    moves.reverse()
+    key = meet
+    while bwd[key][0] is not None:
+        key, name, _ = bwd[key]
+        moves.append(_invname(name))
+    return moves
+
+
+def bond_heuristic(solved):
+    """ Admissible heuristic for distance to solved: a quarter turn moves the
+    12 bonds within its layer only, so it changes at most 12 bonds. """
+    goal = core.cube2key(solved)
+    return lambda key: (bin(key ^ goal).count("1") + 11) // 12
+
+
+def astar_path(mixed, solved, heuristic=None, maxdepth=50):
+    """ Output shortest path from mixed to solved in standard move notation
+    using iterative deepening A* search. heuristic is a function giving for
+    a shape key a lower bound of its distance to solved, bond_heuristic by
+    default, or patterns.heuristic of pattern databases. Uses memory
+    proportional only to path length, so works for puzzles whose graphs are
+    far too big to explore. Raises exception if no path of length at most
+    maxdepth exists. """
+    start, goal = core.cube2key(mixed), core.cube2key(solved)
+    h = heuristic if heuristic else bond_heuristic(solved)
+    path, keys = [], [start]
+
+    def search(key, depth, bound, last):
+        """ Depth-first search below bound, returns the exceeding bound. """
+        est = depth + h(key)
+        if est > bound:
+            return est
+        if key == goal:
+            return -1
+        best = None
+        for new, name, move in _moves(key):
+            # don't undo the last turn, write repeated X' as repeated X
+            if last and move[0] == last[0] and (move[1] != last[1] or move[1]):
+                continue
+            if new in keys:
+                continue
+            path.append(name)
+            keys.append(new)
+            res = search(new, depth + 1, bound, move)
+            if res == -1:
+                return -1
+            path.pop()
+            keys.pop()
+            best = res if best is None else min(best, res)
+        return best if best is not None else maxdepth + 1
+
+    bound = h(start)
+    while bound <= maxdepth:
+        res = search(start, 0, bound, None)
+        if res == -1:
+            return core.join_moves(path)
+        bound = res
+    raise Exception("No path of at most " + str(maxdepth) + " moves found!")
+
+
+def solve(mixed, solved, heuristic=None, maxdepth=50):
+    """ Output shortest path from mixed to solved in standard move notation,
+    in the same format as core.shortest_path but without exploring the
+    puzzle graph. Uses bidirectional breadth-first search, or iterative
+    deepening A* if an admissible heuristic is given, see astar_path. """
+    if heuristic:
+        return astar_path(mixed, solved, heuristic, maxdepth)
+    return bidirectional_path(mixed, solved)
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for bce.core hot paths. Run from the repository root:
+
+    python benchmarks/bench_core.py --out bench.json
+    python benchmarks/bench_core.py --out new.json --compare bench.json
+
+Reports wall time, throughput and peak traced memory per workload, and saves
+them as JSON together with the current git commit for comparison across
+commits.
+"""
+
+import argparse
+import csv
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+import networkx as nx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import bce.core as c  # noqa: E402
+
+
+DATABASE = os.path.join(os.path.dirname(__file__), "..", "puzzles",
+                        "database.csv")
+
+
+def puzzles():
+    """ Dictionary name -> cubelist of all database puzzles. """
+    with open(DATABASE) as f:
+        return {row["Name"]: [int(i) for i in row["Shape"].split(".")]
+                for row in csv.DictReader(f)}
+
+
+def random_moves(cube, n, seed=0):
+    """ A legal sequence of n random quarter turns starting from cube. """
+    rnd = random.Random(seed)
+    key, moves = c.cube2key(cube), []
+    for _ in range(n):
+        fi, name = rnd.choice(c.free_faces(key))
+        key = c.turn_key(fi, key)
+        moves.append(name)
+    return " ".join(moves)
+
+
+def measure(fnc, repeat=3):
+    """ Best wall time of fnc over repeat runs, and peak traced memory of one
+    more run in bytes. Returns (seconds, peak bytes, result). """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fnc()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    fnc()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, res
+
+
+def bench_puzzle(name, cube, repeat):
+    """ List of result records for one puzzle. """
+    res = []
+
+    def record(workload, fnc, units=None):
+        """ Measure fnc, units maps result to {unit name: count}. """
+        secs, peak, out = measure(fnc, repeat)
+        rec = {"puzzle": name, "workload": workload, "seconds": secs,
+               "peak_bytes": peak}
+        for unit, count in (units(out) if units else {}).items():
+            rec[unit] = count
+            rec[unit + "_per_sec"] = count / secs if secs else None
+        res.append(rec)
+        return out
+
+    verts, edges, labels, i2c, c2i = c.explore(cube)
+    sample = [i2c[v] for v in random.Random(0).sample(verts, min(len(verts),
+                                                                  200))]
+    faces = list(c.FACES.values())
+    record("normalize", lambda: [c.normalize(x) for x in sample],
+           lambda out: {"calls": len(out)})
+    record("turn", lambda: [c.turn(f, x) for x in sample for f in faces],
+           lambda out: {"calls": len(out)})
+    record("turnable", lambda: [c.turnable(f, x) for x in sample
+                                for f in faces],
+           lambda out: {"calls": len(out)})
+    moves = random_moves(cube, 1000)
+    record("do_1000", lambda: c.do(cube, moves), lambda out: {"moves": 1000})
+    record("explore", lambda: c.explore(cube),
+           lambda out: {"states": len(out[0]), "edges": len(out[1])})
+    record("explore_compact", lambda: c.explore(cube, compact=True),
+           lambda out: {"states": len(out.keys),
+                        "edges": len(out.indices) // 2})
+
+    g = nx.Graph(edges)
+    targets = [i2c[v] for v in random.Random(1).sample(verts,
+                                                       min(len(verts), 20))]
+    record("shortest_path", lambda: [c.shortest_path(g, t, cube, labels, c2i)
+                                     for t in targets],
+           lambda out: {"queries": len(out)})
+    dist = nx.single_source_shortest_path_length(g, 0)
+    top = max(dist.values())
+    layers = [set(verts)] + [{v for v in verts if dist[v] <= top - k}
+                             for k in range(1, top + 1, max(1, top // 4))]
+    record("layers_distance", lambda: c.layers_distance(g, layers, tally=True),
+           lambda out: {"layers": len(layers)})
+    return res
+
+
+def commit():
+    """ Current git commit hash, or None outside of a git checkout. """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, old):
+    """ Print wall time ratios of results against an older results file. """
+    before = {(r["puzzle"], r["workload"]): r["seconds"]
+              for r in old["results"]}
+    print("\ncompared to", old.get("commit"))
+    for r in results:
+        prev = before.get((r["puzzle"], r["workload"]))
+        if prev:
+            print("%-16s %-16s %6.2fx" % (r["puzzle"], r["workload"],
+                                          r["seconds"] / prev))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--out", help="save results to this JSON file")
+    parser.add_argument("--compare", help="JSON results file to compare to")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--puzzle", action="append",
+                        help="only benchmark named puzzles")
+    args = parser.parse_args(argv)
+
+    results = []
+    for name, cube in puzzles().items():
+        if args.puzzle and name not in args.puzzle:
+            continue
+        for rec in bench_puzzle(name, cube, args.repeat):
+            print("%-16s %-16s %9.4fs %10d B" % (rec["puzzle"],
+                  rec["workload"], rec["seconds"], rec["peak_bytes"]))
+            results.append(rec)
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"commit": commit(), "python": sys.version,
+                       "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, f, indent=1)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
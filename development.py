@@ -1,10 +1,10 @@
 # -*- coding: utf-8 -*-
 
-import csv
 import networkx as nx
 import pandas as pd
 import bce.core as c
-from bce.graphics import draw_cubes
+from bce import export
+from bce.graphics import draw_cubes, render_pages
 
 # shark fin soup
 cube =  [   1,1,2,
@@ -42,19 +42,22 @@ cube = [  2, 2, 10,
 verts, edges, labels, i2c, c2i = c.explore(c.normalize(cube), fullperm=False)
 g = nx.Graph(edges)
 
-with open(r"C:\temp\graph_good.csv", "w") as f:
-    writer = csv.writer(f)
-    writer.writerows([[e[0], e[1], labels[e]] for e in edges])
+export.write_edgelist(r"C:\temp\graph_good.csv", edges, labels)
+export.write_graphml(r"C:\temp\graph_good.graphml", verts, edges, labels, i2c)
+export.save((verts, edges, labels, i2c, c2i), r"C:\temp\graph_good")
+verts, edges, labels, i2c, c2i = export.load(r"C:\temp\graph_good")
 
 draw_cubes([i2c[i] for i in range(121)], ncol=15, size=1)
+# thumbnails, in-process as this script has no __main__ guard
+render_pages([i2c[v] for v in verts], r"C:\temp\shapes", processes=1)
 
 pred, dist = nx.dijkstra_predecessor_and_distance(g, 0)
 for i in range(max(dist.values()) + 1):
     print(i, ":", len(list(filter(lambda x: dist[x] == i, verts))))
 
 # correlate turn distances from solved shape
-distcomp = zip(*[[dist[v], c.similarity(c.nbrrep(i2c[v]), c.nbrrep(i2c[0]))] for v in verts])
-plt.scatter(*distcomp)
+from bce.features import similarities
+plt.scatter([dist[v] for v in verts], similarities(i2c[0], [i2c[v] for v in verts]))
 
 # clustering / classification on all nbrreps
 # http://scikit-learn.org/stable/modules/tree.html
@@ -3,10 +3,10 @@
 The Shark Fin Soup cube
 """
 
-import csv
 import pandas as pd
 import networkx as nx
 import bce.core as c
+from bce import export
 from bce.graphics import draw_cubes
 
 cube =  [   1,1,2,
@@ -49,10 +49,26 @@ scram = [   1,1,2,
 scram = c.normalize(scram)
 c.shortest_path(g, scram, c.normalize(cube), labels, c2i)
 
+# or precompute a solve table once and read off solutions without searching
+import bce.oracle as oracle
+csr = c.explore(cube, compact=True)
+table = oracle.build(csr)
+oracle.solution(csr, table, scram)
+from bce import index
+idx = index.build(csr.keys) # fast cubelist lookups for many queries
+oracle.next_move(csr, table, scram, idx)
+oracle.solution(csr, table, scram, idx)
+
 # export for visualization
-with open(r"C:\temp\graph.csv", "w") as f:
-    writer = csv.writer(f)
-    writer.writerows([[e[0], e[1], labels[e]] for e in edges])
+export.write_edgelist(r"C:\temp\graph.csv", edges, labels)
+export.write_graphml(r"C:\temp\graph.graphml", verts, edges, labels, i2c)
+export.save((verts, edges, labels, i2c, c2i), r"C:\temp\graph")
+verts, edges, labels, i2c, c2i = export.load(r"C:\temp\graph")
+
+# short loops generating the isotropy group, compare with ALGS below
+from bce import group
+grp, gens = group.generators(cube)
+group.order(grp), [moves for moves, perm in gens]
 
 # prepare database format for storing, later check load from db
 c.to_dbrecord(cube)
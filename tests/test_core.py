@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Regression tests pinning exploration results on the puzzle database. Run
+from the repository root:
+
+    python -m pytest tests
+"""
+
+import csv
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import bce.core as c  # noqa: E402
+from bce import graph, group, parallel  # noqa: E402
+
+
+DATABASE = os.path.join(os.path.dirname(__file__), "..", "puzzles",
+                        "database.csv")
+# (states, edges) found by explore before shapes were packed into keys
+BASELINE = {"Alcatraz": (1449, 2048), "Bicube Fuse": (121, 168),
+            "Shark Fin Soup": (1938, 2968)}
+
+
+def _puzzles():
+    """ (name, cubelist) pairs of database puzzles. """
+    with open(DATABASE) as f:
+        return [(row["Name"], [int(i) for i in row["Shape"].split(".")])
+                for row in csv.DictReader(f)]
+
+
+PUZZLES = _puzzles()
+
+
+@pytest.fixture(scope="module", params=PUZZLES, ids=[n for n, _ in PUZZLES])
+def explored(request):
+    name, cube = request.param
+    return name, cube, c.explore(cube)
+
+
+def test_explore_counts(explored):
+    name, _, (verts, edges, _, _, _) = explored
+    assert (len(verts), len(edges)) == BASELINE[name]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_explore_parallel(explored, processes):
+    _, cube, res = explored
+    assert parallel.explore_parallel(cube, processes) == res
+
+
+def test_explore_csr(explored):
+    _, cube, res = explored
+    assert graph.to_explore(graph.explore_csr(cube)) == res
+
+
+def test_group_count(explored):
+    _, cube, _ = explored
+    cube = c.normalize(cube)
+    assert (group.count(group.engine(cube)) ==
+            len(c.explore(cube, fullperm=True)[0]))
@@ -45,23 +45,32 @@ draw_cubes(scrambled)
 
 c.shortest_path(g, scrambled, alca, labels, c2i)
 
+# or without exploring the whole puzzle graph first
+from bce.solve import solve
+solve(scrambled, alca)
+
 # 6. find out how many shapes there are at given distance from solved shape
 pred, dist = nx.dijkstra_predecessor_and_distance(g, 0)
 for i in range(max(dist.values()) + 1):
     print(i, ":", len(list(filter(lambda x: dist[x] == i, verts))))
 
+# or stream the layers without exploring the whole graph, up to distance 8
+for depth, keys, parents, moves in c.explore_layers(alca, maxdepth=8):
+    print(depth, ":", len(keys))
+
 # 7. note however the solved shape is chosen the best way it could be!
-nx.diameter(g)
-nx.radius(g)
-[v for v in verts if nx.eccentricity(g, v) == 16]
-draw_cubes([i2c[v] for v in verts if nx.eccentricity(g, v) == 28], ncol=4)
+from bce.metrics import eccentricity, extremes
+diameter, radius, center, periphery = extremes(g)
+center
+draw_cubes([i2c[v] for v in periphery], ncol=4)
+ecc = eccentricity(g)
 
 # 8. draw the farthest three shapes and find a path to one of them
 farthest = [i2c[v] for v in verts if dist[v] == 16]
 draw_cubes(farthest)
 c.shortest_path(g, alca, farthest[1], labels, c2i)
 
-nx.eccentricity(g, c2i[tuple(farthest[1])])
+ecc[c2i[tuple(farthest[1])]]
 
 # 9. shortest paths are too hard - explore stabilizer / feature chains
 # define a stabilizer chain
@@ -74,14 +83,14 @@ v5 = {v for v in v4    if i2c[v][c.FR] == i2c[v][c.DFR]}
 layers = [v0, v1, v2, v3, v4, v5]
 
 # calculate maximum number of moves (QTM) in each solution step
-d = nx.shortest_path_length(g)
-c.layers_distance(g, layers, dist=d)
-c.layers_distance(g, layers, dist=d, tally=True)
+c.layers_distance(g, layers)
+c.layers_distance(g, layers, tally=True)
 
-# explore the worst cases
-wc = [u for u in v2 - v3 if c.dist_to_next_layer(g, u, layers, d) > 9]
+# explore the worst cases, sharing one search per layer between queries
+ld = c.layer_dists(g, layers)
+wc = [u for u in v2 - v3 if c.dist_to_next_layer(g, u, layers, ld) > 9]
 draw_cubes([i2c[u] for u in wc], size=3)
-c.path_to_next_layer(g, wc[0], layers, d, labels, c2i)
+c.path_to_next_layer(g, wc[0], layers, ld, labels, c2i)
 
 # try a more general feature chain - will it be better?
 v1 = {v for v in verts if i2c[v][c.F] == i2c[v][c.DF] or i2c[v][c.R] == i2c[v][c.DR]}
@@ -90,11 +99,46 @@ v3 = {v for v in v2    if i2c[v][c.FL] == i2c[v][c.DFL] or i2c[v][c.BR] == i2c[v
 v4 = {v for v in v3    if i2c[v][c.FL] == i2c[v][c.DFL] and i2c[v][c.BR] == i2c[v][c.DBR]}
 v5 = {v for v in v4    if i2c[v][c.FR] == i2c[v][c.DFR]}
 layers = [v0, v1, v2, v3, v4, v5]
-c.layers_distance(g, layers, dist=d, tally=True)
+c.layers_distance(g, layers, tally=True)
 
 # explore the worst cases
-wc = [u for u in v3 - v4 if c.dist_to_next_layer(g, u, layers, d) == 9]
+ld = c.layer_dists(g, layers)
+wc = [u for u in v3 - v4 if c.dist_to_next_layer(g, u, layers, ld) == 9]
 draw_cubes([i2c[u] for u in wc], size=3)
-c.path_to_next_layer(g, wc[0], layers, d, labels, c2i)
-
-# TODO: think about less boilerplate for defining chains
\ No newline at end of file
+c.path_to_next_layer(g, wc[0], layers, ld, labels, c2i)
+
+# or define chains declaratively and compare many candidates at once
+from bce.chains import same, any_of, all_of, chain_distances, rank_chains
+csr = c.explore(alca, compact=True)
+chain = [any_of(same(c.F, c.DF), same(c.R, c.DR)),
+         all_of(same(c.F, c.DF), same(c.R, c.DR)),
+         any_of(same(c.FL, c.DFL), same(c.BR, c.DBR)),
+         all_of(same(c.FL, c.DFL), same(c.BR, c.DBR)),
+         same(c.FR, c.DFR)]
+chain_distances(csr, chain, tally=True)
+rank_chains(csr, [chain, chain[::-1]])
+# isotropy group of the Alcatraz from loops at its solved shape, and the
+# number of states with tracked blocks, without exploring them
+import bce.group as gr
+eng = gr.engine(alca)
+gr.order(eng.group), gr.count(eng)
+[(v, fi, w) for v, fi, w, perm in eng.gens] # generating loops along the tree
+gr.reachable(eng, eng.cube)
+
+# watch a long exploration: per depth progress, call counts and timings
+with c.profile(print) as stats:
+    c.explore(alca)
+stats["calls"], stats["seconds"]
+
+# census of all bandage shapes (python -m bce.census census, takes minutes):
+# puzzles with two Quads and a Fuse3
+import bce.census as cs
+census = cs.load("census")
+found = cs.query(census, Quad=2, Fuse3=1)
+draw_cubes([c.key2cube(int(k)) for k in census["puzzles"][found[:9]]])
+
+# find shapes among many without dictionaries: exact and similar ones
+import bce.index as ix
+index = ix.build(csr.keys)
+ix.lookup(index, c.do(alca, "R U"))
+ix.similar(index, c.do(alca, "R U"), k=5)